@@ -31,8 +31,10 @@ def create_bar_chart(postgres_time, neo4j_times, query_name, save_dir):
 
     plt.xticks(x, versions)
     
-    plt.title(f"Tempo di Esecuzione - {query_name}")
-    plt.ylabel("Tempo di esecuzione (ms)")
+    # I tempi inseriti sono quelli mostrati da Neo4j Desktop e pgAdmin: ognuno misura il server a modo suo,
+    # quindi non sono confrontabili tra i motori né con il totale lato client di benchmark.py
+    plt.title(f"Tempo di Esecuzione - {query_name}\nesecuzione sul server (Neo4j Desktop / pgAdmin)")
+    plt.ylabel("Esecuzione sul server (ms)")
     
     plt.tight_layout()
     plt.savefig(os.path.join(save_dir, f"{query_name.replace(' ', '_')}.png"))
@@ -0,0 +1,10 @@
+from neo4j import GraphDatabase
+from neo4j_engine import main
+
+uri = "bolt://localhost:7687"
+driver = GraphDatabase.driver(uri, auth=("neo4j", "adminadmin"))
+
+# Carica una qualsiasi versione definita in neo4j_versions.py, es.:
+# python Scripts/Scripts_Neo4j/csv-to-neo4j-incidenti.py version5 --chunk-size 2000
+if __name__ == "__main__":
+    main(driver)
@@ -0,0 +1,212 @@
+import csv
+import os
+import sys
+import time
+from datetime import datetime
+from neo4j_batch import NodeStatement, has_empty_value, is_empty
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from incidenti_csv import dataset_key, group_incidents
+
+# Scrive i file CSV per "neo4j-admin database import full" usando le stesse STATEMENTS e la stessa
+# add_incident dei caricamenti via Bolt: ImportWriter espone l'interfaccia di BatchWriter ma tiene
+# tutto in memoria e riproduce la deduplicazione delle MERGE (un nodo per chiave, una relazione per coppia).
+
+def node_id(label, keys, values):
+    return label + '|' + '|'.join(str(values[key]) for key in keys)
+
+# Tipi di neo4j-admin per i valori convertiti da incidenti_csv
+COLUMN_TYPES = {bool: ':boolean', int: ':long', float: ':double', datetime: ':localdatetime'}
+
+def column_type(values):
+    types = {type(value) for value in values if value is not None}
+    if len(types) == 1:
+        return COLUMN_TYPES.get(types.pop(), '')
+    return ''
+
+def format_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+class ImportWriter:
+    def __init__(self, statements):
+        self.statements = {statement.name: statement for statement in statements}
+        self.labels = {
+            statement.label: statement for statement in statements if isinstance(statement, NodeStatement)
+        }
+        self.nodes = {statement.name: {} for statement in statements if isinstance(statement, NodeStatement)}
+        self.relationships = {
+            statement.name: set() for statement in statements if not isinstance(statement, NodeStatement)
+        }
+        self.total_rows = 0
+
+    def add_node(self, name, key, props):
+        if has_empty_value(key):
+            return
+        statement = self.statements[name]
+        # Come ON CREATE SET: vale la prima riga che crea il nodo
+        self.nodes[name].setdefault(
+            node_id(statement.label, statement.keys, key),
+            {'ident': key, 'props': {prop: value for prop, value in props.items() if not is_empty(value)}}
+        )
+
+    def add_relationship(self, name, from_key, to_key):
+        if has_empty_value(from_key) or has_empty_value(to_key):
+            return
+        statement = self.statements[name]
+        self.relationships[name].add((
+            tuple(from_key[key] for key in statement.from_keys),
+            tuple(to_key[key] for key in statement.to_keys)
+        ))
+
+    def row_done(self, rows=1):
+        self.total_rows += rows
+
+    def flush(self):
+        pass
+
+    def write_nodes(self, output_dir, name):
+        statement = self.statements[name]
+        nodes = self.nodes[name]
+        props = []
+        for node in nodes.values():
+            for prop in node['props']:
+                if prop not in props and prop not in statement.keys:
+                    props.append(prop)
+        columns = statement.keys + props
+        header = [':ID'] + [
+            column + column_type([node['ident'].get(column, node['props'].get(column)) for node in nodes.values()])
+            for column in columns
+        ] + [':LABEL']
+
+        file_path = os.path.join(output_dir, f"nodes_{statement.label}.csv")
+        with open(file_path, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(header)
+            for identifier, node in nodes.items():
+                values = {**node['props'], **node['ident']}
+                writer.writerow([identifier] + [format_value(values.get(column)) for column in columns] + [statement.label])
+        return statement.label, file_path, len(nodes)
+
+    def lookup(self, label, keys):
+        # Indice (valori delle chiavi usate nella MATCH) -> id dei nodi: una MATCH su una chiave parziale,
+        # ad esempio Strada per solo protocollo, collega tutti i nodi corrispondenti
+        index = {}
+        for identifier, node in self.nodes[self.labels[label].name].items():
+            values = {**node['props'], **node['ident']}
+            if all(key in values for key in keys):
+                index.setdefault(tuple(values[key] for key in keys), []).append(identifier)
+        return index
+
+    def write_relationships(self, output_dir, name):
+        statement = self.statements[name]
+        sources = self.lookup(statement.from_label, statement.from_keys)
+        targets = self.lookup(statement.to_label, statement.to_keys)
+        pairs = set()
+        for from_values, to_values in self.relationships[name]:
+            # Come le MATCH della versione Bolt: senza uno dei due nodi la relazione non viene creata
+            for source in sources.get(from_values, []):
+                for target in targets.get(to_values, []):
+                    pairs.add((source, target))
+
+        file_path = os.path.join(
+            output_dir, f"relationships_{statement.from_label}_{statement.relationship_type}_{statement.to_label}.csv"
+        )
+        with open(file_path, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow([':START_ID', ':END_ID', ':TYPE'])
+            for source, target in sorted(pairs):
+                writer.writerow([source, target, statement.relationship_type])
+        return statement.relationship_type, file_path, len(pairs)
+
+class ImportSink:
+    # Sink della pipeline che al posto di scrivere nel database prepara la cartella per neo4j-admin.
+    # Include anche i nodi :Caricamento, così un successivo avvio con --delta riconosce i file già importati
+    # (e crea i vincoli di unicità tramite prepare_schema).
+
+    def __init__(self, db_name, statements, add_incident, output_dir):
+        self.db_name = db_name
+        self.statements = statements
+        self.add_incident = add_incident
+        self.output_dir = output_dir
+        self.target = f"{db_name} (neo4j-admin)"
+        self.metrics = None
+        self.writer = ImportWriter(statements)
+        self.manifest = []
+        self.current_file = None
+
+    def open(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def wants_file(self, csv_file, checksum):
+        return True
+
+    def start_file(self, csv_file, checksum):
+        if self.current_file is not None:
+            # Il file precedente non è stato letto fino in fondo e le sue righe sono già nel writer:
+            # l'import non può essere completo
+            raise RuntimeError(f"{self.current_file} was not read completely")
+        print(f"Collecting dataset: {csv_file} -> {self.output_dir}")
+        self.current_file = csv_file
+        self.checksum = checksum
+        self.righe = 0
+        self.protocolli = set()
+        self.started = time.perf_counter()
+
+    def load_chunk(self, records):
+        for rows in group_incidents(records):
+            self.add_incident(self.writer, rows)
+            self.writer.row_done(len(rows))
+            self.righe += len(rows)
+            if rows[0].protocollo is not None:
+                self.protocolli.add(rows[0].protocollo)
+
+    def end_file(self, csv_file):
+        self.manifest.append([
+            dataset_key(csv_file), self.checksum, self.righe, ';'.join(str(protocollo) for protocollo in sorted(self.protocolli)),
+            round(time.perf_counter() - self.started, 3), 'Caricamento'
+        ])
+        self.current_file = None
+
+    def write_manifest(self):
+        file_path = os.path.join(self.output_dir, "nodes_Caricamento.csv")
+        with open(file_path, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['file:ID(Caricamento)', 'checksum', 'righe:int', 'protocolli:long[]', 'durata_s:float', ':LABEL'])
+            writer.writerows(self.manifest)
+        return file_path
+
+    def import_command(self, node_files, relationship_files):
+        arguments = [f"neo4j-admin database import full {self.db_name} --overwrite-destination"]
+        arguments += [f"--nodes={file_path}" for label, file_path in node_files]
+        arguments += [f"--relationships={file_path}" for relationship_type, file_path in relationship_files]
+        return ' \\\n    '.join(arguments)
+
+    def close(self):
+        if self.current_file is not None:
+            print(f"Import interrupted while reading {self.current_file}: no files written to {self.output_dir}.")
+            return
+        node_files = []
+        relationship_files = []
+        for statement in self.statements:
+            start = time.perf_counter()
+            if isinstance(statement, NodeStatement):
+                label, file_path, count = self.writer.write_nodes(self.output_dir, statement.name)
+                node_files.append((label, file_path))
+            else:
+                relationship_type, file_path, count = self.writer.write_relationships(self.output_dir, statement.name)
+                relationship_files.append((relationship_type, file_path))
+            if self.metrics is not None:
+                self.metrics.record(self.target, statement.name, count, time.perf_counter() - start)
+            print(f"{statement.name}: {count} written to {file_path}")
+        node_files.append(('Caricamento', self.write_manifest()))
+
+        command = self.import_command(node_files, relationship_files)
+        with open(os.path.join(self.output_dir, 'import.sh'), 'w', encoding='utf-8') as file:
+            file.write(command + '\n')
+        print(f"Rows processed: {self.writer.total_rows}. Stop Neo4j and run:\n{command}")
@@ -0,0 +1,157 @@
+import time
+from collections import namedtuple
+
+# dimension=True segna i nodi condivisi con pochi valori distinti (Gruppo, TipoVeicolo, Sesso):
+# vengono creati una sola volta per valore e poi ogni riga aggiunge solo la relazione
+NodeStatement = namedtuple('NodeStatement', ['name', 'label', 'keys', 'dimension'], defaults=[False])
+RelationshipStatement = namedtuple(
+    'RelationshipStatement',
+    ['name', 'from_label', 'to_label', 'relationship_type', 'from_keys', 'to_keys']
+)
+
+def node_statement(label, keys, dimension=False):
+    return NodeStatement(label, label, list(keys), dimension)
+
+def relationship_statement(from_label, to_label, relationship_type, from_keys, to_keys):
+    name = f"{from_label}-{relationship_type}->{to_label}"
+    return RelationshipStatement(name, from_label, to_label, relationship_type, list(from_keys), list(to_keys))
+
+def create_unwind_node_query(label, keys):
+    # Le proprietà vengono scritte solo alla creazione del nodo: vale la prima riga caricata, come con
+    # ON CONFLICT DO NOTHING in PostgreSQL (es. un protocollo riusato in un file successivo)
+    key_str = ', '.join([f'{key}: row.ident.{key}' for key in keys])
+    return (
+        f"UNWIND $rows AS row "
+        f"MERGE (n:{label} {{{key_str}}}) "
+        f"ON CREATE SET n += row.props"
+    )
+
+def create_unwind_relationship_query(from_label, to_label, relationship_type, from_keys, to_keys):
+    from_str = ', '.join([f'{key}: row.source.{key}' for key in from_keys])
+    to_str = ', '.join([f'{key}: row.target.{key}' for key in to_keys])
+    return (
+        f"UNWIND $rows AS row "
+        f"MATCH (a:{from_label} {{{from_str}}}) "
+        f"MATCH (b:{to_label} {{{to_str}}}) "
+        f"MERGE (a)-[r:{relationship_type}]->(b)"
+    )
+
+def compile_statement(statement):
+    if isinstance(statement, NodeStatement):
+        return create_unwind_node_query(statement.label, statement.keys)
+    return create_unwind_relationship_query(
+        statement.from_label, statement.to_label, statement.relationship_type,
+        statement.from_keys, statement.to_keys
+    )
+
+def compile_queries(statements):
+    return {statement.name: compile_statement(statement) for statement in statements}
+
+def server_time(summary):
+    # Secondi dichiarati dal server per una statement (None se il server non li riporta)
+    if summary.result_available_after is None or summary.result_consumed_after is None:
+        return None
+    return (summary.result_available_after + summary.result_consumed_after) / 1000
+
+def is_empty(value):
+    #0 e False sono valori validi: solo None e la stringa vuota non vengono scritti
+    return value is None or value == ''
+
+def has_empty_value(values):
+    return any(is_empty(value) for value in values.values())
+
+class BatchWriter:
+    # Raccoglie i parametri riga per riga e li invia con un solo UNWIND per tipo di nodo/relazione.
+    # Ogni chunk viene scritto in un'unica transazione esplicita, nell'ordine delle statement
+    # (prima i nodi, poi le relazioni che li collegano).
+    # Con metrics (load_metrics.LoadMetrics) registra la latenza di ogni UNWIND e di ogni transazione.
+
+    def __init__(self, session, statements, chunk_size=1000, seen_dimensions=None, queries=None,
+                 metrics=None, target=None):
+        self.session = session
+        self.metrics = metrics
+        self.target = target
+        # Funzione checkpoint(tx) eseguita nella stessa transazione di ogni chunk (punto di ripresa del sink)
+        self.checkpoint = None
+        self.statements = {statement.name: statement for statement in statements}
+        # Le query possono arrivare già compilate dal sink, che le riusa per tutti i file
+        self.queries = queries if queries is not None else compile_queries(statements)
+        self.buffers = {statement.name: [] for statement in statements}
+        self.chunk_size = chunk_size
+        # Valori delle dimensioni già inviati; il sink lo condivide tra i file della stessa esecuzione
+        self.seen_dimensions = seen_dimensions if seen_dimensions is not None else {}
+        # Relazioni verso nodi dimensione: le righe vengono ordinate per valore della dimensione, così
+        # transazioni concorrenti acquisiscono i lock su quei nodi sempre nello stesso ordine
+        dimension_labels = {
+            statement.label for statement in statements if isinstance(statement, NodeStatement) and statement.dimension
+        }
+        self.lock_order = {}
+        for statement in statements:
+            if isinstance(statement, RelationshipStatement):
+                if statement.from_label in dimension_labels:
+                    self.lock_order[statement.name] = 'source'
+                elif statement.to_label in dimension_labels:
+                    self.lock_order[statement.name] = 'target'
+        self.pending_rows = 0
+        self.total_rows = 0
+        self.elapsed = 0.0
+
+    def add_node(self, name, key, props):
+        if has_empty_value(key):
+            return
+        if self.statements[name].dimension:
+            seen = self.seen_dimensions.setdefault(name, set())
+            value = tuple(key.values())
+            if value in seen:
+                return
+            seen.add(value)
+        props = {prop: value for prop, value in props.items() if not is_empty(value)}
+        self.buffers[name].append({'ident': key, 'props': props})
+
+    def add_relationship(self, name, from_key, to_key):
+        if has_empty_value(from_key) or has_empty_value(to_key):
+            return
+        self.buffers[name].append({'source': from_key, 'target': to_key})
+
+    def row_done(self, rows=1):
+        self.pending_rows += rows
+        if self.pending_rows >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending_rows and not any(self.buffers.values()):
+            return
+        for name, side in self.lock_order.items():
+            self.buffers[name].sort(key=lambda row: tuple(row[side].values()))
+        start = time.perf_counter()
+        self.session.execute_write(self._write_chunk)
+        elapsed = time.perf_counter() - start
+        self.elapsed += elapsed
+        if self.metrics is not None:
+            # Comprende commit ed eventuali tentativi ripetuti da execute_write
+            self.metrics.record(self.target, 'transaction', self.pending_rows, elapsed)
+        self.total_rows += self.pending_rows
+        self.pending_rows = 0
+        for rows in self.buffers.values():
+            rows.clear()
+
+    def _write_chunk(self, tx):
+        for name, rows in self.buffers.items():
+            if rows:
+                start = time.perf_counter()
+                summary = tx.run(self.queries[name], rows=rows).consume()
+                if self.metrics is not None:
+                    self.metrics.record(self.target, name, len(rows), time.perf_counter() - start, server_time(summary))
+        if self.checkpoint is not None:
+            self.checkpoint(tx)
+
+    def rows_per_second(self):
+        if not self.elapsed:
+            return 0.0
+        return self.total_rows / self.elapsed
+
+    def report(self):
+        print(
+            f"Written {self.total_rows} rows in {self.elapsed:.2f} s "
+            f"({self.rows_per_second():.0f} rows/s, chunk size {self.chunk_size})"
+        )
@@ -0,0 +1,98 @@
+import argparse
+import os
+import sys
+from neo4j_admin_export import ImportSink
+from neo4j_batch import node_statement, relationship_statement
+from neo4j_sink import Neo4jSink
+from neo4j_versions import VERSIONS
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from incidenti_csv import get_csv_files
+from pipeline import run_pipeline
+
+# Caricatore unico per tutte le versioni: la specifica in neo4j_versions.py viene tradotta una volta
+# in STATEMENTS (le query UNWIND vengono compilate dal sink) e in una funzione add_incident che per
+# ogni riga si limita a leggere i valori già associati a ogni nodo e relazione. add_incident riceve tutte
+# le righe di un incidente (una per persona): i nodi e le relazioni condivisi, come Incidente, Strada o
+# Veicolo, vengono passati al writer una volta sola.
+
+def is_pedone(incident):
+    tipopersona = incident.tipopersona
+    return bool(tipopersona) and tipopersona.lower() == 'pedone'
+
+def row_values(incident):
+    values = incident._asdict()
+    values['localizzazione'] = (incident.localizzazione1 or '') + ' ' + (incident.localizzazione2 or '')
+    values['sesso_tipo'] = incident.sesso.upper() if incident.sesso else 'NON_SPECIFICATO'
+    return values
+
+def compile_version(spec):
+    statements = []
+    operations = []
+    for node in spec['nodes']:
+        statement = node_statement(node['label'], node['keys'], node.get('dimension', False))
+        statements.append(statement)
+        operations.append((
+            'node', statement.name, node.get('scope', 'incidente'),
+            list(node['keys'].items()), list(node.get('props', {}).items())
+        ))
+    for rel in spec['relationships']:
+        statement = relationship_statement(rel['from'], rel['to'], rel['type'], rel['from_keys'], rel['to_keys'])
+        statements.append(statement)
+        operations.append((
+            'relationship', statement.name, rel.get('scope', 'incidente'),
+            list(rel['from_keys'].items()), list(rel['to_keys'].items())
+        ))
+
+    def add_incident(writer, rows):
+        nodes = {}
+        relationships = {}
+        for incident in rows:
+            values = row_values(incident)
+            veicolo = not is_pedone(incident)
+            for kind, name, scope, first, second in operations:
+                if scope == 'veicolo' and not veicolo:
+                    continue
+                first_values = {prop: values[source] for prop, source in first}
+                second_values = {prop: values[source] for prop, source in second}
+                if kind == 'node':
+                    # Come ON CREATE SET: vale la prima riga del nodo, come in PostgreSQL
+                    nodes.setdefault((name, tuple(first_values.values())), (first_values, second_values))
+                else:
+                    relationships.setdefault(
+                        (name, tuple(first_values.values()), tuple(second_values.values())),
+                        (first_values, second_values)
+                    )
+        for (name, _), (key, props) in nodes.items():
+            writer.add_node(name, key, props)
+        for (name, _, _), (from_key, to_key) in relationships.items():
+            writer.add_relationship(name, from_key, to_key)
+
+    return statements, add_incident
+
+def main(driver, db_name=None):
+    parser = argparse.ArgumentParser()
+    if db_name is None:
+        parser.add_argument('version', choices=sorted(VERSIONS), help="Graph model to load (see neo4j_versions.py)")
+    parser.add_argument('--chunk-size', type=int, default=1000, help="CSV rows per write transaction")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Concurrent write sessions; rows are partitioned by protocollo hash")
+    parser.add_argument('--delta', action='store_true', help="Load only files that are new or changed since the last run")
+    parser.add_argument('--admin-import', metavar='DIR', nargs='?', const='',
+                        help="Write neo4j-admin import files instead of loading through Bolt (default ./import/<database>)")
+    parser.add_argument('--report', metavar='PATH',
+                        help="JSON file for the load metrics (default ./reports/caricamento_<timestamp>.json)")
+    args = parser.parse_args()
+    if db_name is None:
+        db_name = args.version
+
+    statements, add_incident = compile_version(VERSIONS[db_name])
+    incidents_csv_files = get_csv_files('./Datasets/')
+    if args.admin_import is not None:
+        sink = ImportSink(db_name, statements, add_incident, args.admin_import or f'./import/{db_name}')
+    else:
+        sink = Neo4jSink(driver, db_name, statements, add_incident, args.chunk_size, args.delta, args.workers)
+    run_pipeline(incidents_csv_files, [sink], report_path=args.report)
+
+    driver.close()
+    print('All data has been processed and the connection to Neo4j is closed.')
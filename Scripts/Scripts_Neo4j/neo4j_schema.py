@@ -0,0 +1,70 @@
+from neo4j_batch import NodeStatement
+
+def identity_keys(statements):
+    return [(statement.label, statement.keys) for statement in statements if isinstance(statement, NodeStatement)]
+
+def lookups(statements):
+    # Ogni coppia (label, proprietà) usata da un MERGE o da un MATCH del loader
+    result = []
+    for statement in statements:
+        if isinstance(statement, NodeStatement):
+            candidates = [(statement.label, statement.keys)]
+        else:
+            candidates = [(statement.from_label, statement.from_keys), (statement.to_label, statement.to_keys)]
+        for candidate in candidates:
+            if candidate not in result:
+                result.append(candidate)
+    return result
+
+def is_covered(keys, indexed_properties):
+    # Un indice (anche composito) è utilizzabile solo se tutte le sue proprietà compaiono nel lookup
+    return any(set(properties) <= set(keys) for properties in indexed_properties)
+
+def create_constraints(session, statements):
+    print("Creating constraints...")
+    keys_by_label = {}
+    for label, keys in identity_keys(statements):
+        keys_by_label.setdefault(label, []).append(keys)
+        properties = ', '.join([f'n.{key}' for key in keys])
+        if len(keys) > 1:
+            properties = f'({properties})'
+        session.run(
+            f"CREATE CONSTRAINT {label.lower()}_{'_'.join(keys)}_unique IF NOT EXISTS "
+            f"FOR (n:{label}) REQUIRE {properties} IS UNIQUE"
+        ).consume()
+
+    # MATCH che non usano la chiave completa del nodo (es. Strada cercata solo per protocollo)
+    for label, keys in lookups(statements):
+        if not is_covered(keys, keys_by_label.get(label, [])):
+            session.run(
+                f"CREATE INDEX {label.lower()}_{'_'.join(keys)} IF NOT EXISTS "
+                f"FOR (n:{label}) ON ({', '.join([f'n.{key}' for key in keys])})"
+            ).consume()
+
+    session.run("CALL db.awaitIndexes(300)").consume()
+    print("Constraints and indexes online.")
+
+def verify_indexes(session, statements):
+    indexed = {}
+    result = session.run(
+        "SHOW INDEXES YIELD labelsOrTypes, properties, state, entityType "
+        "WHERE entityType = 'NODE' AND properties IS NOT NULL"
+    )
+    for record in result:
+        if record["state"] != 'ONLINE':
+            continue
+        for label in record["labelsOrTypes"]:
+            indexed.setdefault(label, []).append(record["properties"])
+
+    missing = [
+        f"{label}({', '.join(keys)})"
+        for label, keys in lookups(statements)
+        if not is_covered(keys, indexed.get(label, []))
+    ]
+    if missing:
+        raise RuntimeError(f"Lookups without an online index: {', '.join(missing)}")
+    print("All loader lookups are backed by an online index.")
+
+def prepare_schema(session, statements):
+    create_constraints(session, statements)
+    verify_indexes(session, statements)
@@ -0,0 +1,218 @@
+import os
+import sys
+import time
+from neo4j_batch import BatchWriter, compile_queries
+from neo4j_parallel import PartitionedWriter
+from neo4j_schema import prepare_schema
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from incidenti_csv import dataset_key, group_incidents, persona_id_range
+
+# Etichette dei nodi che appartengono a un singolo incidente (cancellati quando il file di origine cambia)
+INCIDENT_LABELS = ['Incidente', 'Strada', 'Veicolo', 'Persona']
+MANIFEST_LABELS = ['Caricamento', 'CaricamentoInCorso']
+
+def create_database_if_not_exists(session, db_name):
+    result = session.run("SHOW DATABASES")
+    databases = [record["name"] for record in result]
+    if db_name not in databases:
+        session.run(f"CREATE DATABASE {db_name}")
+        print(f"Database '{db_name}' created.")
+    else:
+        print(f"Database '{db_name}' already exists.")
+
+def normalize_manifest_keys(session):
+    # I manifest scritti prima di dataset_key usano il percorso relativo alla cartella di lancio
+    # (es. Datasets/2021/csv_incidentiGennaio.csv): vengono riportati alla chiave <anno>/<file>
+    for label in MANIFEST_LABELS:
+        files = [record["file"] for record in session.run(f"MATCH (c:{label}) RETURN c.file AS file")]
+        for file_name in files:
+            key = dataset_key(file_name)
+            if key == file_name:
+                continue
+            existing = session.run(f"MATCH (c:{label} {{file: $file}}) RETURN count(c) AS n", file=key).single()["n"]
+            update = "DELETE c" if existing else "SET c.file = $key"
+            session.run(f"MATCH (c:{label} {{file: $file}}) {update}", file=file_name, key=key).consume()
+
+def read_manifest(session):
+    result = session.run("MATCH (c:Caricamento) RETURN c.file AS file, c.checksum AS checksum, c.protocolli AS protocolli")
+    return {record["file"]: record for record in result}
+
+def record_manifest(session, file_name, checksum, righe, protocolli, durata):
+    session.run(
+        "MERGE (c:Caricamento {file: $file}) "
+        "SET c.checksum = $checksum, c.righe = $righe, c.protocolli = $protocolli, "
+        "c.durata_s = $durata, c.caricato_il = datetime()",
+        file=file_name, checksum=checksum, righe=righe, protocolli=protocolli, durata=durata
+    ).consume()
+
+def read_checkpoints(session):
+    result = session.run(
+        "MATCH (k:CaricamentoInCorso) RETURN k.file AS file, k.checksum AS checksum, "
+        "k.righe AS righe, k.protocolli AS protocolli"
+    )
+    return {record["file"]: record for record in result}
+
+def record_checkpoint(tx, file_name, checksum, righe, protocolli):
+    tx.run(
+        "MERGE (k:CaricamentoInCorso {file: $file}) "
+        "SET k.checksum = $checksum, k.righe = $righe, k.protocolli = $protocolli, k.aggiornato_il = datetime()",
+        file=file_name, checksum=checksum, righe=righe, protocolli=protocolli
+    ).consume()
+
+def delete_checkpoint(session, file_name):
+    session.run("MATCH (k:CaricamentoInCorso {file: $file}) DELETE k", file=file_name).consume()
+
+def shared_protocolli(session, file_name):
+    # Protocolli caricati anche da altri file (il dataset riusa alcuni protocolli in mesi diversi)
+    result = session.run(
+        "MATCH (c) WHERE (c:Caricamento OR c:CaricamentoInCorso) AND c.file <> $file "
+        "UNWIND c.protocolli AS protocollo RETURN DISTINCT protocollo",
+        file=file_name
+    )
+    return {record["protocollo"] for record in result}
+
+def delete_file(session, file_name, protocolli):
+    # Come in PostgreSQL: le persone del file (l'id contiene il mese del file) e gli incidenti che nessun
+    # altro file ha caricato; un incidente con un protocollo presente anche in un altro file resta
+    start, end = persona_id_range(file_name)
+    session.run(
+        "MATCH (n:Persona) WHERE n.idpersona >= $start AND n.idpersona < $end DETACH DELETE n",
+        start=start, end=end
+    ).consume()
+    shared = shared_protocolli(session, file_name)
+    protocolli = [protocollo for protocollo in protocolli if protocollo not in shared]
+    for label in INCIDENT_LABELS:
+        session.run(
+            f"MATCH (n:{label}) WHERE n.protocollo IN $protocolli DETACH DELETE n",
+            protocolli=protocolli
+        ).consume()
+
+class Neo4jSink:
+    def __init__(self, driver, db_name, statements, add_incident, chunk_size=1000, delta=False, workers=1):
+        self.driver = driver
+        self.db_name = db_name
+        self.statements = statements
+        self.queries = compile_queries(statements)
+        self.add_incident = add_incident
+        self.chunk_size = chunk_size
+        self.delta = delta
+        self.workers = workers
+        self.target = db_name
+        self.metrics = None
+        self.manifest = {}
+        self.checkpoints = {}
+        self.seen_dimensions = {}
+        self.session = None
+        self.writer = None
+
+    def open(self):
+        with self.driver.session() as session:
+            create_database_if_not_exists(session, self.db_name)
+        with self.driver.session(database=self.db_name) as session:
+            prepare_schema(session, self.statements)
+            session.run(
+                "CREATE CONSTRAINT caricamento_file_unique IF NOT EXISTS "
+                "FOR (c:Caricamento) REQUIRE c.file IS UNIQUE"
+            ).consume()
+            session.run(
+                "CREATE CONSTRAINT caricamento_in_corso_file_unique IF NOT EXISTS "
+                "FOR (k:CaricamentoInCorso) REQUIRE k.file IS UNIQUE"
+            ).consume()
+            normalize_manifest_keys(session)
+            self.manifest = read_manifest(session)
+            self.checkpoints = read_checkpoints(session)
+
+    def wants_file(self, csv_file, checksum):
+        entry = self.manifest.get(dataset_key(csv_file))
+        if not self.delta or entry is None:
+            return True
+        if entry["checksum"] == checksum:
+            print(f"{csv_file} already loaded in {self.db_name}, skipped.")
+            return False
+        return True
+
+    def start_file(self, csv_file, checksum):
+        print(f"Processing dataset: {csv_file} -> {self.db_name}")
+        self.release_file()
+        self.session = self.driver.session(database=self.db_name)
+        self.csv_file = csv_file
+        self.key = dataset_key(csv_file)
+        self.checksum = checksum
+        self.righe = 0
+        self.da_saltare = 0
+        self.protocolli = set()
+        entry = self.manifest.get(self.key)
+        # In modalità delta un file interrotto riprende dopo l'ultimo chunk confermato, se non è cambiato
+        checkpoint = self.checkpoints.get(self.key) if self.delta else None
+        if checkpoint is not None and checkpoint["checksum"] == checksum:
+            print(f"Resuming {csv_file} from row {checkpoint['righe']}.")
+            self.righe = self.da_saltare = checkpoint["righe"]
+            self.protocolli = set(checkpoint["protocolli"] or [])
+        else:
+            if checkpoint is not None and checkpoint["protocolli"]:
+                print(f"{csv_file} changed during an interrupted load: removing the rows already written.")
+                delete_file(self.session, self.key, checkpoint["protocolli"])
+            if entry is not None and entry["protocolli"]:
+                print(f"{csv_file} changed: removing the data loaded from the previous version.")
+                delete_file(self.session, self.key, entry["protocolli"])
+        if self.workers > 1:
+            self.writer = PartitionedWriter(
+                self.driver, self.db_name, self.statements, self.workers,
+                self.chunk_size, self.seen_dimensions, self.queries, self.metrics
+            )
+        else:
+            self.writer = BatchWriter(
+                self.session, self.statements, self.chunk_size, self.seen_dimensions, self.queries,
+                self.metrics, self.db_name
+            )
+        self.writer.checkpoint = self.save_checkpoint
+        self.started = time.perf_counter()
+
+    def save_checkpoint(self, tx):
+        # Righe e protocolli vengono aggiornati prima di row_done, quindi al flush descrivono esattamente
+        # le righe scritte nel chunk
+        record_checkpoint(tx, self.key, self.checksum, self.righe, sorted(self.protocolli))
+
+    def load_chunk(self, records):
+        if self.da_saltare:
+            # Righe già confermate prima dell'interruzione
+            skipped = min(self.da_saltare, len(records))
+            records = records[skipped:]
+            self.da_saltare -= skipped
+        # I blocchi della pipeline non dividono gli incidenti, quindi anche i flush (e i checkpoint)
+        # cadono sempre tra un incidente e l'altro
+        for rows in group_incidents(records):
+            protocollo = rows[0].protocollo
+            self.righe += len(rows)
+            if protocollo is not None:
+                self.protocolli.add(protocollo)
+            if self.workers > 1:
+                self.writer.start_row(protocollo)
+            self.add_incident(self.writer, rows)
+            self.writer.row_done(len(rows))
+
+    def end_file(self, csv_file):
+        self.writer.flush()
+        self.writer.report()
+        if self.workers > 1:
+            self.writer.close()
+        record_manifest(
+            self.session, self.key, self.checksum, self.righe, sorted(self.protocolli),
+            time.perf_counter() - self.started
+        )
+        delete_checkpoint(self.session, self.key)
+        self.session.close()
+        self.session = None
+
+    def release_file(self):
+        # Sessioni di un file non terminato (errore di lettura o chiusura del sink): le righe non ancora
+        # inviate vengono scartate, il checkpoint descrive solo i chunk confermati
+        if self.workers > 1 and self.session is not None:
+            self.writer.close()
+        if self.session is not None:
+            self.session.close()
+        self.session = None
+
+    def close(self):
+        self.release_file()
@@ -0,0 +1,125 @@
+# Modelli a grafo dei database Neo4j. Ogni versione è un elenco di nodi e di relazioni:
+# - 'keys' e 'props' associano le proprietà del nodo ai valori della riga (campi di IncidentRecord
+#   più quelli calcolati in neo4j_engine.row_values: localizzazione, sesso_tipo);
+# - 'scope': 'veicolo' limita il nodo/la relazione alle righe che non descrivono un pedone
+#   (veicolo e conducente), come nei caricatori originali;
+# - 'dimension': True crea il nodo una sola volta per valore (Gruppo, TipoVeicolo, Sesso).
+# Una nuova variante (es. version5) si aggiunge qui, senza scrivere un altro caricatore.
+
+INCIDENTE = {
+    'label': 'Incidente',
+    'keys': {'protocollo': 'protocollo'},
+    'props': {
+        'dataincidente': 'dataoraincidente',
+        'chilometrica': 'chilometrica',
+        'natura': 'naturaincidente',
+        'traffico': 'traffico',
+        'condizioneatm': 'condizioneatmosferica',
+        'visibilita': 'visibilita',
+        'illuminazione': 'illuminazione',
+        'numero_feriti': 'num_feriti',
+        'numero_illesi': 'num_illesi',
+        'numero_morti': 'num_morti',
+        'longitudine': 'longitude',
+        'latitudine': 'latitude'
+    }
+}
+INCIDENTE_CON_GRUPPO = dict(INCIDENTE, props={**INCIDENTE['props'], 'gruppo': 'gruppo'})
+
+GRUPPO = {'label': 'Gruppo', 'keys': {'nome': 'gruppo'}, 'dimension': True}
+
+STRADA = {
+    'label': 'Strada',
+    'keys': {'protocollo': 'protocollo', 'nome': 'strada1'},
+    'props': {
+        'localizzazione': 'localizzazione',
+        'particolarita': 'particolaritastrade',
+        'tipostrada': 'tipostrada',
+        'fondostradale': 'fondostradale',
+        'pavimentazione': 'pavimentazione',
+        'segnaletica': 'segnaletica'
+    }
+}
+
+VEICOLO = {
+    'label': 'Veicolo',
+    'keys': {'protocollo': 'protocollo', 'progressivo': 'progressivo'},
+    'props': {'statoveicolo': 'statoveicolo', 'statoairbag': 'airbag'},
+    'scope': 'veicolo'
+}
+VEICOLO_CON_TIPO = dict(VEICOLO, props={**VEICOLO['props'], 'tipoveicolo': 'tipoveicolo'})
+
+TIPOVEICOLO = {'label': 'TipoVeicolo', 'keys': {'nome': 'tipoveicolo'}, 'dimension': True, 'scope': 'veicolo'}
+
+PERSONA = {
+    'label': 'Persona',
+    'keys': {'idpersona': 'idpersona'},
+    'props': {
+        'protocollo': 'protocollo',
+        'sesso': 'sesso',
+        'tipolesione': 'tipolesione',
+        'casco_cintura': 'cinturacascoutilizzato',
+        'deceduto': 'deceduto',
+        'deceduto_dopo': 'decedutodopo',
+        'tipopersona': 'tipopersona'
+    },
+    'scope': 'veicolo'
+}
+
+SESSO = {'label': 'Sesso', 'keys': {'tipo': 'sesso_tipo'}, 'dimension': True, 'scope': 'veicolo'}
+
+def relationship(from_label, relationship_type, to_label, from_keys, to_keys, scope='veicolo'):
+    return {
+        'from': from_label, 'type': relationship_type, 'to': to_label,
+        'from_keys': from_keys, 'to_keys': to_keys, 'scope': scope
+    }
+
+INCIDENTE_KEY = {'protocollo': 'protocollo'}
+STRADA_KEY = {'protocollo': 'protocollo', 'nome': 'strada1'}
+VEICOLO_KEY = {'protocollo': 'protocollo', 'progressivo': 'progressivo'}
+PERSONA_KEY = {'idpersona': 'idpersona'}
+CONDUCENTE_KEY = {'protocollo': 'protocollo', 'idpersona': 'idpersona'}
+PERSONA_SESSO_KEY = {'idpersona': 'idpersona', 'protocollo': 'protocollo'}
+
+INTERVENUTO = relationship('Gruppo', 'INTERVENUTO', 'Incidente', {'nome': 'gruppo'}, INCIDENTE_KEY, scope='incidente')
+OCCORSO_SU = relationship('Incidente', 'OCCORSO_SU', 'Strada', INCIDENTE_KEY, INCIDENTE_KEY, scope='incidente')
+COINVOLGE_VEICOLO = relationship('Incidente', 'COINVOLGE_VEICOLO', 'Veicolo', INCIDENTE_KEY, VEICOLO_KEY)
+VEICOLO_COINVOLTO_IN = relationship('Veicolo', 'VEICOLO_COINVOLTO_IN', 'Incidente', VEICOLO_KEY, INCIDENTE_KEY)
+COINVOLGE_PERSONA = relationship('Incidente', 'COINVOLGE_PERSONA', 'Persona', INCIDENTE_KEY, PERSONA_KEY)
+PERSONA_COINVOLTA_IN = relationship('Persona', 'PERSONA_COINVOLTA_IN', 'Incidente', PERSONA_KEY, INCIDENTE_KEY)
+VEICOLO_TIPO = relationship('Veicolo', 'TIPO', 'TipoVeicolo', VEICOLO_KEY, {'nome': 'tipoveicolo'})
+TIPO_VEICOLO = relationship('TipoVeicolo', 'TIPO', 'Veicolo', {'nome': 'tipoveicolo'}, VEICOLO_KEY)
+SU = relationship('Veicolo', 'SU', 'Strada', VEICOLO_KEY, STRADA_KEY)
+VEICOLO_PRESENTE = relationship('Strada', 'VEICOLO_PRESENTE', 'Veicolo', STRADA_KEY, VEICOLO_KEY)
+GUIDATO_DA = relationship('Veicolo', 'GUIDATO_DA', 'Persona', VEICOLO_KEY, CONDUCENTE_KEY)
+GUIDA = relationship('Persona', 'GUIDA', 'Veicolo', PERSONA_KEY, VEICOLO_KEY)
+HA_SESSO = relationship('Persona', 'HA_SESSO', 'Sesso', PERSONA_SESSO_KEY, {'tipo': 'sesso_tipo'})
+SESSO_HA = relationship('Sesso', 'HA_SESSO', 'Persona', {'tipo': 'sesso_tipo'}, PERSONA_SESSO_KEY)
+
+VERSIONS = {
+    # Modello base: gruppo e tipo di veicolo restano proprietà
+    'version1': {
+        'nodes': [INCIDENTE_CON_GRUPPO, STRADA, VEICOLO_CON_TIPO, PERSONA],
+        'relationships': [OCCORSO_SU, COINVOLGE_VEICOLO, COINVOLGE_PERSONA, SU, GUIDATO_DA]
+    },
+    # Tipo di veicolo e sesso diventano nodi
+    'version2': {
+        'nodes': [INCIDENTE_CON_GRUPPO, STRADA, VEICOLO, TIPOVEICOLO, PERSONA, SESSO],
+        'relationships': [OCCORSO_SU, COINVOLGE_VEICOLO, COINVOLGE_PERSONA, VEICOLO_TIPO, SU, GUIDATO_DA, HA_SESSO]
+    },
+    # Anche il gruppo che è intervenuto diventa un nodo
+    'version3': {
+        'nodes': [INCIDENTE, GRUPPO, STRADA, VEICOLO, TIPOVEICOLO, PERSONA, SESSO],
+        'relationships': [
+            INTERVENUTO, OCCORSO_SU, COINVOLGE_VEICOLO, COINVOLGE_PERSONA, VEICOLO_TIPO, SU, GUIDATO_DA, HA_SESSO
+        ]
+    },
+    # Come version3, con le relazioni inverse
+    'version4': {
+        'nodes': [INCIDENTE, GRUPPO, STRADA, VEICOLO, TIPOVEICOLO, PERSONA, SESSO],
+        'relationships': [
+            INTERVENUTO, OCCORSO_SU, COINVOLGE_VEICOLO, VEICOLO_COINVOLTO_IN, COINVOLGE_PERSONA, PERSONA_COINVOLTA_IN,
+            VEICOLO_TIPO, TIPO_VEICOLO, SU, VEICOLO_PRESENTE, GUIDATO_DA, GUIDA, HA_SESSO, SESSO_HA
+        ]
+    }
+}
@@ -1,9 +1,21 @@
 import psycopg2
+import psycopg2.extensions
 import csv
-import chardet
-from tqdm import tqdm
 import os
-import re 
+import sys
+import io
+import argparse
+import multiprocessing
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from incidenti_cache import source_checksum
+from incidenti_csv import (
+    CHUNK_SIZE, RECORD_FIELDS, dataset_key, file_month, get_csv_files, group_incidents, persona_id_range
+)
+from load_metrics import LoadMetrics, sql_statement_name
+from pipeline import run_pipeline, timed_chunks
+from query_catalog import QUERIES
 
 def connect_to_postgres():
     try:
@@ -42,6 +54,33 @@ def reset_database():
     except Exception as e:
         print(f"Errore nella cancellazione o ricreazione del database: {e}")
 
+class MetricsCursor(psycopg2.extensions.cursor):
+    #Cursore che registra in LoadMetrics la latenza di ogni execute e copy_expert, raggruppata per tipo
+    #di statement (es. "INSERT INTO persona"), con le righe toccate
+    metrics = None
+    target = 'postgres'
+
+    def timed(self, query, function, *args):
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            if self.metrics is not None:
+                self.metrics.record(
+                    self.target, sql_statement_name(query), max(self.rowcount, 0), time.perf_counter() - start
+                )
+
+    def execute(self, query, vars=None):
+        return self.timed(query, super().execute, query, vars)
+
+    def copy_expert(self, sql, file, size=8192):
+        return self.timed(sql, super().copy_expert, sql, file, size)
+
+def metrics_cursor(conn, metrics):
+    cur = conn.cursor(cursor_factory=MetricsCursor)
+    cur.metrics = metrics
+    return cur
+
 def connect_to_db():
     try:
         conn = psycopg2.connect(
@@ -56,69 +95,165 @@ def connect_to_db():
         print(f"Errore nella connessione al database incidenti: {e}")
         return None
 
-def create_tables(conn):
-    try:
-        cur = conn.cursor()
+def create_flat_tables(cur):
+    cur.execute(""" 
+        CREATE TABLE IF NOT EXISTS incidente (
+            Protocollo INTEGER PRIMARY KEY,
+            Gruppo INTEGER,
+            Dataincidente TIMESTAMP,
+            chilometrica VARCHAR(60),
+            natura TEXT,
+            traffico VARCHAR(50),
+            condizioneatm VARCHAR(50),
+            visibilita VARCHAR(50),
+            illuminazione VARCHAR(50),
+            numero_feriti INTEGER,
+            numero_illesi INTEGER,
+            numero_mort INTEGER,
+            longitudine DOUBLE PRECISION,
+            latitudine DOUBLE PRECISION
+        );
+    """)
 
-      
-        cur.execute(""" 
-            CREATE TABLE IF NOT EXISTS incidente (
-                Protocollo INTEGER PRIMARY KEY,
-                Gruppo INTEGER,
-                Dataincidente TIMESTAMP,
-                chilometrica VARCHAR(60),
-                natura TEXT,
-                traffico VARCHAR(50),
-                condizioneatm VARCHAR(50),
-                visibilita VARCHAR(50),
-                illuminazione VARCHAR(50),
-                numero_feriti INTEGER,
-                numero_illesi INTEGER,
-                numero_mort INTEGER,
-                longitudine VARCHAR(50),
-                latitudine VARCHAR(50)
-            );
-        """)
+    cur.execute(""" 
+        CREATE TABLE IF NOT EXISTS veicolo (
+            Protocollo INTEGER,
+            progressivo INTEGER,
+            tipo_veicolo VARCHAR(50),
+            stato_veicolo VARCHAR(50),
+            stato_airbag VARCHAR(50),
+            PRIMARY KEY (Protocollo, progressivo),
+            FOREIGN KEY (Protocollo) REFERENCES incidente(Protocollo) ON DELETE CASCADE
+        );
+    """)
 
-        cur.execute(""" 
-            CREATE TABLE IF NOT EXISTS veicolo (
-                Protocollo INTEGER,
-                progressivo INTEGER,
-                tipo_veicolo VARCHAR(50),
-                stato_veicolo VARCHAR(50),
-                stato_airbag VARCHAR(50),
-                PRIMARY KEY (Protocollo, progressivo),
-                FOREIGN KEY (Protocollo) REFERENCES incidente(Protocollo) ON DELETE CASCADE
-            );
-        """)
+    cur.execute(""" 
+        CREATE TABLE IF NOT EXISTS strada (
+            idstrada SERIAL,
+            Protocollo INTEGER,
+            strada1 VARCHAR(255),
+            localizzazione VARCHAR(255),
+            particolarita VARCHAR(255),
+            tipostrada VARCHAR(255),
+            fondostradale VARCHAR(255),
+            pavimentazione VARCHAR(255),
+            segnaletica VARCHAR(255),
+            FOREIGN KEY (Protocollo) REFERENCES incidente(Protocollo) ON DELETE CASCADE,
+            PRIMARY KEY (Protocollo, strada1) 
+        );
+    """)
+
+    cur.execute(""" 
+        CREATE TABLE IF NOT EXISTS persona (
+            idpersona BIGINT PRIMARY KEY,
+            Protocollo INTEGER,
+            tipopersona VARCHAR(255),
+            sesso VARCHAR(255),
+            tipolesione VARCHAR(255),
+            cintura_casco VARCHAR(255),
+            deceduto BOOLEAN,
+            deceduto_dopo VARCHAR(255),
+            FOREIGN KEY (Protocollo) REFERENCES incidente(Protocollo) ON DELETE CASCADE
+        );
+    """)
+
+#Schema partizionato per mese dell'incidente: la data entra nella chiave primaria (e nelle chiavi esterne),
+#ogni file mensile viene caricato in tabelle a parte e poi agganciato con ATTACH PARTITION
+def create_partitioned_tables(cur):
+    cur.execute(""" 
+        CREATE TABLE IF NOT EXISTS incidente (
+            Protocollo INTEGER NOT NULL,
+            Gruppo INTEGER,
+            Dataincidente TIMESTAMP NOT NULL,
+            chilometrica VARCHAR(60),
+            natura TEXT,
+            traffico VARCHAR(50),
+            condizioneatm VARCHAR(50),
+            visibilita VARCHAR(50),
+            illuminazione VARCHAR(50),
+            numero_feriti INTEGER,
+            numero_illesi INTEGER,
+            numero_mort INTEGER,
+            longitudine DOUBLE PRECISION,
+            latitudine DOUBLE PRECISION,
+            PRIMARY KEY (Protocollo, Dataincidente)
+        ) PARTITION BY RANGE (Dataincidente);
+    """)
+
+    cur.execute(""" 
+        CREATE TABLE IF NOT EXISTS strada (
+            idstrada SERIAL,
+            Protocollo INTEGER,
+            Dataincidente TIMESTAMP NOT NULL,
+            strada1 VARCHAR(255),
+            localizzazione VARCHAR(255),
+            particolarita VARCHAR(255),
+            tipostrada VARCHAR(255),
+            fondostradale VARCHAR(255),
+            pavimentazione VARCHAR(255),
+            segnaletica VARCHAR(255),
+            FOREIGN KEY (Protocollo, Dataincidente) REFERENCES incidente(Protocollo, Dataincidente) ON DELETE CASCADE,
+            PRIMARY KEY (Protocollo, strada1, Dataincidente)
+        ) PARTITION BY RANGE (Dataincidente);
+    """)
+
+    cur.execute(""" 
+        CREATE TABLE IF NOT EXISTS veicolo (
+            Protocollo INTEGER,
+            progressivo INTEGER,
+            Dataincidente TIMESTAMP NOT NULL,
+            tipo_veicolo VARCHAR(50),
+            stato_veicolo VARCHAR(50),
+            stato_airbag VARCHAR(50),
+            PRIMARY KEY (Protocollo, progressivo, Dataincidente),
+            FOREIGN KEY (Protocollo, Dataincidente) REFERENCES incidente(Protocollo, Dataincidente) ON DELETE CASCADE
+        ) PARTITION BY RANGE (Dataincidente);
+    """)
+
+    cur.execute(""" 
+        CREATE TABLE IF NOT EXISTS persona (
+            idpersona BIGINT,
+            Protocollo INTEGER,
+            Dataincidente TIMESTAMP NOT NULL,
+            tipopersona VARCHAR(255),
+            sesso VARCHAR(255),
+            tipolesione VARCHAR(255),
+            cintura_casco VARCHAR(255),
+            deceduto BOOLEAN,
+            deceduto_dopo VARCHAR(255),
+            PRIMARY KEY (idpersona, Dataincidente),
+            FOREIGN KEY (Protocollo, Dataincidente) REFERENCES incidente(Protocollo, Dataincidente) ON DELETE CASCADE
+        ) PARTITION BY RANGE (Dataincidente);
+    """)
+
+def create_tables(conn, partizionato=False):
+    try:
+        cur = conn.cursor()
+        if partizionato:
+            create_partitioned_tables(cur)
+        else:
+            create_flat_tables(cur)
 
+        #Manifest dei file caricati, usato dalla modalità delta
         cur.execute(""" 
-            CREATE TABLE IF NOT EXISTS strada (
-                idstrada SERIAL,
-                Protocollo INTEGER,
-                strada1 VARCHAR(255),
-                localizzazione VARCHAR(255),
-                particolarita VARCHAR(255),
-                tipostrada VARCHAR(255),
-                fondostradale VARCHAR(255),
-                pavimentazione VARCHAR(255),
-                segnaletica VARCHAR(255),
-                FOREIGN KEY (Protocollo) REFERENCES incidente(Protocollo) ON DELETE CASCADE,
-                PRIMARY KEY (Protocollo, strada1) 
+            CREATE TABLE IF NOT EXISTS caricamenti (
+                file VARCHAR(255) PRIMARY KEY,
+                checksum CHAR(64),
+                righe INTEGER,
+                protocolli INTEGER[],
+                durata_s DOUBLE PRECISION,
+                caricato_il TIMESTAMP DEFAULT now()
             );
         """)
 
+        #Punto di ripresa del file in corso: aggiornato nella stessa transazione di ogni blocco di righe
         cur.execute(""" 
-            CREATE TABLE IF NOT EXISTS persona (
-                idpersona SERIAL PRIMARY KEY,
-                Protocollo INTEGER,
-                tipopersona VARCHAR(255),
-                sesso VARCHAR(255),
-                tipolesione VARCHAR(255),
-                cintura_casco VARCHAR(255),
-                deceduto INTEGER,
-                deceduto_dopo VARCHAR(255),
-                FOREIGN KEY (Protocollo) REFERENCES incidente(Protocollo) ON DELETE CASCADE
+            CREATE TABLE IF NOT EXISTS caricamenti_in_corso (
+                file VARCHAR(255) PRIMARY KEY,
+                checksum CHAR(64),
+                righe INTEGER,
+                protocolli INTEGER[],
+                aggiornato_il TIMESTAMP DEFAULT now()
             );
         """)
 
@@ -128,126 +263,557 @@ def create_tables(conn):
     except Exception as e:
         print(f"Errore nella creazione delle tabelle: {e}")
 
-def insert_data_from_csv(conn, csv_files):
-    try:
-        cur = conn.cursor()
-
-        for csv_file in csv_files:
-            print(f"Importando dati da: {csv_file}")
-
-            #Mi serve per capire la codifica del csv
-            with open(csv_file, 'rb') as file:
-                raw_data = file.read()
-                result = chardet.detect(raw_data)
-                encoding = result['encoding']
-
-            try:
-                with open(csv_file, 'r', encoding=encoding) as file:
-                    reader = csv.DictReader(file, delimiter=';')
-                    rows = list(reader)
-            except Exception as e:
-                print(f"Errore durante l'apertura del file {csv_file} con codifica {encoding}: {e}")
+def normalize_manifest_keys(cur):
+    #I manifest scritti prima di dataset_key usano il percorso relativo alla cartella di lancio
+    #(es. Datasets/2021/csv_incidentiGennaio.csv): vengono riportati alla chiave <anno>/<file>
+    for tabella in ('caricamenti', 'caricamenti_in_corso'):
+        cur.execute(f"SELECT file FROM {tabella};")
+        for (file,) in cur.fetchall():
+            chiave = dataset_key(file)
+            if chiave == file:
                 continue
+            cur.execute(
+                f"UPDATE {tabella} SET file = %s WHERE file = %s "
+                f"AND NOT EXISTS (SELECT 1 FROM {tabella} WHERE file = %s);",
+                (chiave, file, chiave)
+            )
+            cur.execute(f"DELETE FROM {tabella} WHERE file = %s;", (file,))
 
-            for row in tqdm(rows, desc=f"Importando {csv_file}", unit="riga"):
-                if 'Protocollo' not in row or not row['Protocollo']:
-                    print("Protocollo mancante o non trovato, riga ignorata:", row)
-                    continue
+def read_manifest(cur):
+    cur.execute("SELECT file, checksum, protocolli FROM caricamenti;")
+    return {file: (checksum, protocolli) for file, checksum, protocolli in cur.fetchall()}
+
+def record_manifest(cur, csv_file, checksum, righe, protocolli, durata):
+    cur.execute(""" 
+        INSERT INTO caricamenti (file, checksum, righe, protocolli, durata_s, caricato_il)
+        VALUES (%s, %s, %s, %s, %s, now())
+        ON CONFLICT (file) DO UPDATE SET
+            checksum = EXCLUDED.checksum, righe = EXCLUDED.righe, protocolli = EXCLUDED.protocolli,
+            durata_s = EXCLUDED.durata_s, caricato_il = EXCLUDED.caricato_il;
+    """, (csv_file, checksum, righe, protocolli, durata))
+
+def read_checkpoints(cur):
+    cur.execute("SELECT file, checksum, righe, protocolli FROM caricamenti_in_corso;")
+    return {file: (checksum, righe, protocolli) for file, checksum, righe, protocolli in cur.fetchall()}
+
+def record_checkpoint(cur, csv_file, checksum, righe, protocolli):
+    cur.execute(""" 
+        INSERT INTO caricamenti_in_corso (file, checksum, righe, protocolli, aggiornato_il)
+        VALUES (%s, %s, %s, %s, now())
+        ON CONFLICT (file) DO UPDATE SET
+            checksum = EXCLUDED.checksum, righe = EXCLUDED.righe, protocolli = EXCLUDED.protocolli,
+            aggiornato_il = EXCLUDED.aggiornato_il;
+    """, (csv_file, checksum, righe, protocolli))
+
+def delete_checkpoint(cur, csv_file):
+    cur.execute("DELETE FROM caricamenti_in_corso WHERE file = %s;", (csv_file,))
+
+def shared_protocolli(cur, chiave):
+    #Protocolli caricati anche da altri file (il dataset riusa alcuni protocolli in mesi diversi)
+    cur.execute("""
+        SELECT unnest(protocolli) FROM caricamenti WHERE file <> %s
+        UNION SELECT unnest(protocolli) FROM caricamenti_in_corso WHERE file <> %s;
+    """, (chiave, chiave))
+    return {protocollo for (protocollo,) in cur.fetchall()}
+
+def delete_file(cur, chiave, protocolli):
+    #Rimuove i dati di un file: le sue persone (l'id contiene il mese del file) e gli incidenti che nessun
+    #altro file ha caricato, con veicoli, strade e persone (vincolo ON DELETE CASCADE). Un incidente con un
+    #protocollo presente anche in un altro file resta, perché le righe di quel file vi fanno riferimento
+    inizio, fine = persona_id_range(chiave)
+    cur.execute("DELETE FROM persona WHERE idpersona >= %s AND idpersona < %s;", (inizio, fine))
+    condivisi = shared_protocolli(cur, chiave)
+    cur.execute(
+        "DELETE FROM incidente WHERE Protocollo = ANY(%s);",
+        ([protocollo for protocollo in protocolli if protocollo not in condivisi],)
+    )
 
-                cur.execute(""" 
-                    INSERT INTO incidente (
-                        Protocollo, Gruppo, Dataincidente, chilometrica, natura, traffico, condizioneatm, visibilita,
-                        illuminazione, numero_feriti, numero_illesi, numero_mort, longitudine, latitudine
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (Protocollo) DO NOTHING;
-                """, (
-                    row['Protocollo'], row['Gruppo'] or None, row['DataOraIncidente'], row['Chilometrica'] or None,
-                    row['NaturaIncidente'] or None, row['Traffico'] or None, row['CondizioneAtmosferica'] or None,
-                    row['Visibilita'] or None, row['Illuminazione'] or None, row['NUM_FERITI'] or None,
-                    row['NUM_ILLESI'] or None, row['NUM_MORTI'] or None, row['Longitude'] or None,
-                    row['Latitude'] or None
-                ))
-
-                if row['Progressivo']:
-                    cur.execute(""" 
-                        INSERT INTO veicolo (
-                            Protocollo, progressivo, tipo_veicolo, stato_veicolo, stato_airbag
-                        ) VALUES (%s, %s, %s, %s, %s)
-                        ON CONFLICT (Protocollo, progressivo) DO NOTHING;
-                    """, (
-                        row['Protocollo'], row['Progressivo'], row['TipoVeicolo'] or None,
-                        row['StatoVeicolo'] or None, row['Airbag'] or None
-                    ))
-
-                cur.execute(""" 
-                    INSERT INTO strada (
-                        Protocollo, strada1, localizzazione, particolarita, tipostrada, fondostradale, pavimentazione, segnaletica
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT DO NOTHING;
-                """, (
-                    row['Protocollo'], row['STRADA1'] or None, row['Localizzazione1'] or None,
-                    row['particolaritastrade'] or None, row['TipoStrada'] or None,
-                    row['FondoStradale'] or None, row['Pavimentazione'] or None, row['Segnaletica'] or None
-                ))
-
-                cur.execute(""" 
-                    INSERT INTO persona (
-                        Protocollo, tipopersona, sesso, tipolesione, cintura_casco, deceduto, deceduto_dopo
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT DO NOTHING;
-                """, (
-                    row['Protocollo'], row['TipoPersona'] or None, row['Sesso'] or None,
-                    row['Tipolesione'] or None, row['CinturaCascoUtilizzato'] or None,
-                    row['Deceduto'] or None, row['DecedutoDopo'] or None
-                ))
+def insert_rows(cur, incidents):
+    # Le righe di un incidente (una per persona) sono consecutive: incidente e strada vengono inseriti una
+    # volta per incidente, veicolo una volta per progressivo, persona per ogni riga
+    for rows in group_incidents(incidents):
+        row = rows[0]
+        if row.protocollo is None:
+            for row in rows:
+                print("Protocollo mancante o non trovato, riga ignorata:", row)
+            continue
+
+        cur.execute("""
+            INSERT INTO incidente (
+                Protocollo, Gruppo, Dataincidente, chilometrica, natura, traffico, condizioneatm, visibilita,
+                illuminazione, numero_feriti, numero_illesi, numero_mort, longitudine, latitudine
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (Protocollo) DO NOTHING;
+        """, (
+            row.protocollo, row.gruppo, row.dataoraincidente, row.chilometrica,
+            row.naturaincidente, row.traffico, row.condizioneatmosferica,
+            row.visibilita, row.illuminazione, row.num_feriti,
+            row.num_illesi, row.num_morti, row.longitude,
+            row.latitude
+        ))
+
+        # Come ON CONFLICT DO NOTHING: vale la prima riga di ogni veicolo e di ogni strada
+        veicoli = {}
+        strade = {}
+        for row in rows:
+            if row.progressivo is not None:
+                veicoli.setdefault(row.progressivo, row)
+            strade.setdefault(row.strada1, row)
+
+        for row in veicoli.values():
+            cur.execute("""
+                INSERT INTO veicolo (
+                    Protocollo, progressivo, tipo_veicolo, stato_veicolo, stato_airbag
+                ) VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (Protocollo, progressivo) DO NOTHING;
+            """, (
+                row.protocollo, row.progressivo, row.tipoveicolo,
+                row.statoveicolo, row.airbag
+            ))
+
+        for row in strade.values():
+            cur.execute("""
+                INSERT INTO strada (
+                    Protocollo, strada1, localizzazione, particolarita, tipostrada, fondostradale, pavimentazione, segnaletica
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT DO NOTHING;
+            """, (
+                row.protocollo, row.strada1, row.localizzazione1,
+                row.particolaritastrade, row.tipostrada,
+                row.fondostradale, row.pavimentazione, row.segnaletica
+            ))
+
+        for row in rows:
+            cur.execute("""
+                INSERT INTO persona (
+                    idpersona, Protocollo, tipopersona, sesso, tipolesione, cintura_casco, deceduto, deceduto_dopo
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (idpersona) DO NOTHING;
+            """, (
+                row.idpersona, row.protocollo, row.tipopersona, row.sesso,
+                row.tipolesione, row.cinturacascoutilizzato,
+                row.deceduto, row.decedutodopo
+            ))
+
+def create_staging_table(cur):
+    columns = ', '.join([f'{column} TEXT' for column in RECORD_FIELDS])
+    cur.execute("DROP TABLE IF EXISTS temporanea;")
+    cur.execute(f"CREATE UNLOGGED TABLE temporanea (file_ordine INTEGER NOT NULL DEFAULT 0, riga BIGSERIAL, {columns});")
+
+def copy_rows_to_staging(cur, rows, columns=RECORD_FIELDS):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    writer.writerows(rows)
+    buffer.seek(0)
+    cur.copy_expert(
+        f"COPY temporanea ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, DELIMITER ';')",
+        buffer
+    )
+
+def copy_incidents_to_staging(cur, incidents):
+    #Le righe già lette dal modulo csv vengono riscritte in un formato che COPY accetta senza ambiguità
+    #(nel dataset ci sono virgolette non bilanciate all'interno dei campi)
+    rows = []
+    for row in incidents:
+        if row.protocollo is None:
+            print("Protocollo mancante o non trovato, riga ignorata:", row)
+            continue
+        rows.append(row)
+    copy_rows_to_staging(cur, rows)
+
+def merge_staging(cur, suffisso='', partizionato=False):
+    #Con suffisso i dati vanno nelle tabelle di un singolo mese (es. incidente_2020_01); nello schema
+    #partizionato anche strada, veicolo e persona hanno la data dell'incidente, che fa parte delle chiavi
+    data_colonna = ", Dataincidente" if partizionato else ""
+    data_valore = ", dataoraincidente::TIMESTAMP" if partizionato else ""
+
+    cur.execute(f""" 
+        INSERT INTO incidente{suffisso} (
+            Protocollo, Gruppo, Dataincidente, chilometrica, natura, traffico, condizioneatm, visibilita,
+            illuminazione, numero_feriti, numero_illesi, numero_mort, longitudine, latitudine
+        )
+        SELECT DISTINCT ON (protocollo::INTEGER)
+            protocollo::INTEGER, gruppo::INTEGER, dataoraincidente::TIMESTAMP, chilometrica, naturaincidente,
+            traffico, condizioneatmosferica, visibilita, illuminazione, num_feriti::INTEGER, num_illesi::INTEGER,
+            num_morti::INTEGER, longitude::DOUBLE PRECISION, latitude::DOUBLE PRECISION
+        FROM temporanea
+        ORDER BY protocollo::INTEGER, file_ordine, riga
+        ON CONFLICT (Protocollo{data_colonna}) DO NOTHING;
+    """)
 
+    cur.execute(f""" 
+        INSERT INTO veicolo{suffisso} (
+            Protocollo, progressivo, tipo_veicolo, stato_veicolo, stato_airbag{data_colonna}
+        )
+        SELECT DISTINCT ON (protocollo::INTEGER, progressivo::INTEGER)
+            protocollo::INTEGER, progressivo::INTEGER, tipoveicolo, statoveicolo, airbag{data_valore}
+        FROM temporanea
+        WHERE progressivo IS NOT NULL
+        ORDER BY protocollo::INTEGER, progressivo::INTEGER, file_ordine, riga
+        ON CONFLICT (Protocollo, progressivo{data_colonna}) DO NOTHING;
+    """)
+
+    cur.execute(f""" 
+        INSERT INTO strada{suffisso} (
+            Protocollo, strada1, localizzazione, particolarita, tipostrada, fondostradale, pavimentazione,
+            segnaletica{data_colonna}
+        )
+        SELECT DISTINCT ON (protocollo::INTEGER, strada1)
+            protocollo::INTEGER, strada1, localizzazione1, particolaritastrade, tipostrada, fondostradale,
+            pavimentazione, segnaletica{data_valore}
+        FROM temporanea
+        ORDER BY protocollo::INTEGER, strada1, file_ordine, riga
+        ON CONFLICT DO NOTHING;
+    """)
+
+    cur.execute(f""" 
+        INSERT INTO persona{suffisso} AS persona (
+            idpersona, Protocollo, tipopersona, sesso, tipolesione, cintura_casco, deceduto, deceduto_dopo{data_colonna}
+        )
+        SELECT DISTINCT ON (idpersona::BIGINT)
+            idpersona::BIGINT, protocollo::INTEGER, tipopersona, sesso, tipolesione, cinturacascoutilizzato,
+            deceduto::BOOLEAN, decedutodopo{data_valore}
+        FROM temporanea
+        WHERE idpersona IS NOT NULL
+        ORDER BY idpersona::BIGINT, file_ordine, riga
+        ON CONFLICT (idpersona{data_colonna}) DO NOTHING;
+    """)
+
+def load_incidents_copy(cur, incidents, suffisso='', partizionato=False):
+    cur.execute("TRUNCATE temporanea RESTART IDENTITY;")
+    copy_incidents_to_staging(cur, incidents)
+    merge_staging(cur, suffisso, partizionato)
+
+#Tabelle partizionate, nell'ordine delle chiavi esterne (incidente prima delle tabelle che la referenziano)
+PARTITIONED_TABLES = ['incidente', 'strada', 'veicolo', 'persona']
+
+def month_partition(csv_file):
+    anno, mese = file_month(csv_file)
+    fine = (anno + 1, 1) if mese == 12 else (anno, mese + 1)
+    return f"_{anno}_{mese:02d}", f"{anno}-{mese:02d}-01", f"{fine[0]}-{fine[1]:02d}-01"
+
+def create_month_tables(cur, suffisso, inizio, fine):
+    #Tabelle autonome con la stessa struttura del padre; il CHECK sul mese permette ad ATTACH PARTITION
+    #di non riscandire i dati
+    for tabella in PARTITIONED_TABLES:
+        cur.execute(f"CREATE TABLE {tabella}{suffisso} (LIKE {tabella} INCLUDING ALL);")
+        cur.execute(
+            f"ALTER TABLE {tabella}{suffisso} ADD CONSTRAINT {tabella}{suffisso}_mese "
+            f"CHECK (Dataincidente >= %s AND Dataincidente < %s);",
+            (inizio, fine)
+        )
+
+def attach_month_tables(cur, suffisso, inizio, fine):
+    for tabella in PARTITIONED_TABLES:
+        cur.execute(
+            f"ALTER TABLE {tabella} ATTACH PARTITION {tabella}{suffisso} FOR VALUES FROM (%s) TO (%s);",
+            (inizio, fine)
+        )
+
+def drop_month_tables(cur, suffisso):
+    #Sostituire un mese costa un DETACH e un DROP per tabella invece di una DELETE riga per riga
+    for tabella in reversed(PARTITIONED_TABLES):
+        cur.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(%s));",
+            (f"{tabella}{suffisso}",)
+        )
+        if cur.fetchone()[0]:
+            cur.execute(f"ALTER TABLE {tabella} DETACH PARTITION {tabella}{suffisso};")
+        cur.execute(f"DROP TABLE IF EXISTS {tabella}{suffisso};")
+
+#Indici secondari e di copertura per le query di query_catalog.py (filtri su tipo_veicolo, fondostradale,
+#gruppo, sesso/tipolesione e join su persona.protocollo), creati dopo il caricamento dei dati
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS incidente_gruppo_idx ON incidente (gruppo);",
+    "CREATE INDEX IF NOT EXISTS veicolo_tipo_veicolo_idx ON veicolo (tipo_veicolo) INCLUDE (protocollo);",
+    "CREATE INDEX IF NOT EXISTS persona_protocollo_idx ON persona (protocollo) INCLUDE (idpersona);",
+    "CREATE INDEX IF NOT EXISTS persona_tipolesione_sesso_idx ON persona (tipolesione, sesso) INCLUDE (protocollo, idpersona);",
+    "CREATE INDEX IF NOT EXISTS strada_fondostradale_idx ON strada (fondostradale) INCLUDE (protocollo);",
+]
+
+#Statistiche estese sulle colonne correlate, usate dal planner per stimare i filtri combinati
+STATISTICS = [
+    "CREATE STATISTICS IF NOT EXISTS persona_sesso_tipolesione_stats (dependencies, mcv) "
+    "ON sesso, tipolesione FROM persona;",
+    "CREATE STATISTICS IF NOT EXISTS strada_fondo_stats (dependencies, mcv) "
+    "ON fondostradale, pavimentazione, tipostrada FROM strada;",
+    "CREATE STATISTICS IF NOT EXISTS veicolo_tipo_stato_stats (dependencies, mcv) "
+    "ON tipo_veicolo, stato_veicolo, stato_airbag FROM veicolo;",
+]
+
+def scan_nodes(plan):
+    scans = []
+    nodes = [plan]
+    while nodes:
+        node = nodes.pop()
+        if node.get('Relation Name') or node.get('Index Name'):
+            scans.append((node['Node Type'], node.get('Relation Name', ''), node.get('Index Name', '')))
+        nodes.extend(node.get('Plans', []))
+    return sorted(scans)
+
+def explain_catalog(cur):
+    plans = []
+    for query in QUERIES:
+        cur.execute(f"EXPLAIN (FORMAT JSON) {query['sql']}", query['params'] or None)
+        plans.append(scan_nodes(cur.fetchone()[0][0]['Plan']))
+    return plans
+
+def format_scan(scan):
+    node_type, relation, index = scan
+    label = ' '.join(part for part in (node_type, relation) if part)
+    return label + (f" ({index})" if index else "")
+
+def print_index_report(before, after):
+    print("Piani delle query del catalogo prima e dopo gli indici:")
+    for query, scans_before, scans_after in zip(QUERIES, before, after):
+        name = query['name'].split(' (')[0]
+        if scans_before == scans_after:
+            print(f"  {name}: invariato ({', '.join(format_scan(scan) for scan in scans_after)})")
+            continue
+        indexed = [scan for scan in scans_after if 'Index' in scan[0] and scan not in scans_before]
+        print(f"  {name}: {', '.join(format_scan(scan) for scan in scans_before)}")
+        print(f"    -> {', '.join(format_scan(scan) for scan in scans_after)}")
+        if indexed:
+            print(f"    nuovi accessi tramite indice: {', '.join(format_scan(scan) for scan in indexed)}")
+
+def create_indexes(cur):
+    cur.execute("ANALYZE;")
+    before = explain_catalog(cur)
+    for statement in INDEXES + STATISTICS:
+        cur.execute(statement)
+    cur.execute("ANALYZE;")
+    print_index_report(before, explain_catalog(cur))
+
+def copy_file_to_staging(task):
+    #Eseguita in un processo separato, con una propria connessione: legge un file e lo copia nella tabella
+    #di appoggio numerando le righe, così il merge finale può ricostruire l'ordine del caricamento seriale
+    #(serve a DISTINCT ON per scegliere la stessa riga; gli id delle persone non dipendono dall'ordine)
+    file_ordine, csv_file = task
+    conn = connect_to_db()
+    if conn is None:
+        raise RuntimeError(f"Connessione al database fallita per {csv_file}")
+    #Le metriche del file vengono restituite al processo principale, che le unisce al report
+    metrics = LoadMetrics()
+    metrics.start_file(csv_file)
+    try:
+        cur = metrics_cursor(conn, metrics)
+        riga = 0
+        for records in timed_chunks(csv_file, CHUNK_SIZE, metrics):
+            rows = []
+            for record in records:
+                riga += 1
+                if record.protocollo is None:
+                    print("Protocollo mancante o non trovato, riga ignorata:", record)
+                    continue
+                rows.append((file_ordine, riga) + record)
+            copy_rows_to_staging(cur, rows, ['file_ordine', 'riga'] + RECORD_FIELDS)
         conn.commit()
         cur.close()
+        return file_ordine, csv_file, source_checksum(csv_file), riga, metrics.files[csv_file]
+    finally:
+        conn.close()
+
+def insert_data_parallel(csv_files, processi, indici=True, report_path=None):
+    reset_database()
+    conn = connect_to_db()
+    if conn is None:
+        return
+    create_tables(conn)
+    metrics = LoadMetrics(CHUNK_SIZE)
+    cur = metrics_cursor(conn, metrics)
+    try:
+        create_staging_table(cur)
+        conn.commit()
+
+        tasks = [(file_ordine, os.path.normpath(csv_file)) for file_ordine, csv_file in enumerate(csv_files)]
+        copied = {}
+        started = time.perf_counter()
+        with multiprocessing.Pool(processi) as pool:
+            for file_ordine, csv_file, checksum, righe, file_metrics in pool.imap_unordered(copy_file_to_staging, tasks):
+                copied[file_ordine] = (csv_file, checksum, righe)
+                metrics.add_file(csv_file, file_metrics)
+                print(f"Copiato {csv_file}: {righe} righe")
+
+        #Il merge set-based avviene una sola volta, nell'ordine dei file, come nel caricamento seriale
+        merge_staging(cur)
+
+        durata = time.perf_counter() - started
+        cur.execute("SELECT file_ordine, array_agg(DISTINCT protocollo::INTEGER) FROM temporanea GROUP BY file_ordine;")
+        for file_ordine, protocolli in cur.fetchall():
+            csv_file, checksum, righe = copied[file_ordine]
+            record_manifest(cur, dataset_key(csv_file), checksum, righe, protocolli, durata)
+        cur.execute("DROP TABLE IF EXISTS temporanea;")
+        conn.commit()
         print("Dati inseriti con successo dai CSV.")
+        if indici:
+            create_indexes(cur)
+            conn.commit()
     except Exception as e:
-        print(f"Errore nell'inserimento dei dati dai CSV: {e}")
-
-def month_order_key(filename):
-    month_map = {
-        "Gennaio": 1,
-        "Febbraio": 2,
-        "Marzo": 3,
-        "Aprile": 4,
-        "Maggio": 5,
-        "Giugno": 6,
-        "Luglio": 7,
-        "Agosto": 8,
-        "Settembre": 9,
-        "Ottobre": 10,
-        "Novembre": 11,
-        "Dicembre": 12
-    }
-    
-    month = re.search(r'csv_incidenti(.*?).csv', filename)  
-    if month:
-        month_name = month.group(1).strip()  
-        return month_map.get(month_name, 0)  
-    return 0  
-
-def get_csv_files(base_directory):
-    csv_files = []
-    for dirpath, _, filenames in os.walk(base_directory):
-        year = os.path.basename(dirpath) 
-        if year.isdigit(): 
-            for filename in filenames:
-                if filename.endswith('.csv'):
-                    csv_files.append((year, filename)) 
-
-    csv_files.sort(key=lambda x: (int(x[0]), month_order_key(x[1])))  
-
-    return [os.path.join(base_directory, x[0], x[1]) for x in csv_files]  
+        print(f"Errore nell'inserimento parallelo dei dati dai CSV: {e}")
+        conn.rollback()
+    finally:
+        cur.close()
+        conn.close()
+        print(f"Report del caricamento: {metrics.write_report(report_path)}")
+
+class PostgresSink:
+    def __init__(self, modalita='copy', delta=False, indici=True, partizionato=False):
+        self.modalita = modalita
+        self.delta = delta
+        self.indici = indici
+        self.partizionato = partizionato
+        self.suffisso = ''
+        self.target = 'postgres'
+        self.metrics = None
+        self.conn = None
+        self.cur = None
+        self.failed = False
+        self.manifest = {}
+        self.checkpoints = None
 
+    def open(self):
+        if not self.delta:
+            reset_database()
+        self.conn = connect_to_db()
+        if self.conn is None:
+            self.failed = True
+            return
+        create_tables(self.conn, self.partizionato)
+        self.cur = metrics_cursor(self.conn, self.metrics)
+        normalize_manifest_keys(self.cur)
+        self.manifest = read_manifest(self.cur)
+        self.checkpoints = read_checkpoints(self.cur)
+        if self.modalita == 'copy':
+            create_staging_table(self.cur)
+
+    def wants_file(self, csv_file, checksum):
+        if self.failed:
+            return False
+        entry = self.manifest.get(dataset_key(csv_file))
+        if self.delta and entry is not None and entry[0] == checksum:
+            print(f"{csv_file} già caricato in PostgreSQL, saltato.")
+            return False
+        return True
+
+    def start_file(self, csv_file, checksum):
+        print(f"Importando dati da: {csv_file}")
+        self.csv_file = csv_file
+        self.chiave = dataset_key(csv_file)
+        self.checksum = checksum
+        self.righe = 0
+        self.da_saltare = 0
+        self.protocolli = set()
+        self.started = time.perf_counter()
+        entry = self.manifest.get(self.chiave)
+        #In modalità delta un file interrotto riprende dall'ultimo blocco confermato, se non è cambiato
+        checkpoint = self.checkpoints.get(self.chiave) if self.delta else None
+        if checkpoint is not None and checkpoint[0] == checksum:
+            print(f"Ripresa di {csv_file} dalla riga {checkpoint[1]}.")
+            self.righe = self.da_saltare = checkpoint[1]
+            self.protocolli = set(checkpoint[2] or [])
+            if self.partizionato:
+                self.suffisso, self.inizio, self.fine = month_partition(csv_file)
+            return
+        if checkpoint is not None and checkpoint[2] and not self.partizionato:
+            print(f"{csv_file} modificato durante un caricamento interrotto: rimozione dei dati già caricati.")
+            self.run(delete_file, self.chiave, checkpoint[2])
+        if self.partizionato:
+            self.suffisso, self.inizio, self.fine = month_partition(csv_file)
+            if entry is not None:
+                print(f"{csv_file} modificato: sostituzione delle partizioni *{self.suffisso}.")
+            self.run(drop_month_tables, self.suffisso)
+            self.run(create_month_tables, self.suffisso, self.inizio, self.fine)
+        elif entry is not None and entry[1]:
+            print(f"{csv_file} modificato: rimozione dei dati caricati in precedenza.")
+            self.run(delete_file, self.chiave, entry[1])
+
+    def load_chunk(self, records):
+        if self.da_saltare:
+            #Righe già confermate prima dell'interruzione
+            saltate = min(self.da_saltare, len(records))
+            records = records[saltate:]
+            self.da_saltare -= saltate
+            if not records:
+                return
+        self.righe += len(records)
+        self.protocolli.update(record.protocollo for record in records if record.protocollo is not None)
+        if self.modalita == 'copy':
+            self.run(load_incidents_copy, records, self.suffisso, self.partizionato)
+        else:
+            self.run(insert_rows, records)
+        #Ogni blocco viene confermato insieme al punto di ripresa: un errore successivo perde al massimo
+        #il blocco in corso e la transazione resta limitata a un blocco di righe
+        self.run(record_checkpoint, self.chiave, self.checksum, self.righe, sorted(self.protocolli))
+        self.commit()
+
+    def end_file(self, csv_file):
+        if self.partizionato:
+            self.run(attach_month_tables, self.suffisso, self.inizio, self.fine)
+        self.run(record_manifest, self.chiave, self.checksum, self.righe, sorted(self.protocolli),
+                 time.perf_counter() - self.started)
+        self.run(delete_checkpoint, self.chiave)
+        self.commit()
+
+    def commit(self):
+        if not self.failed:
+            self.conn.commit()
+
+    def run(self, function, *args):
+        if self.failed:
+            return
+        try:
+            function(self.cur, *args)
+        except Exception as e:
+            print(f"Errore nell'inserimento dei dati dai CSV: {e}")
+            self.conn.rollback()
+            self.failed = True
+
+    def close(self):
+        if self.conn is None:
+            return
+        if not self.failed:
+            if self.modalita == 'copy':
+                self.cur.execute("DROP TABLE IF EXISTS temporanea;")
+            self.conn.commit()
+            print("Dati inseriti con successo dai CSV.")
+            #Gli indici vengono creati dopo il commit dei dati: un errore qui non annulla il caricamento
+            if self.indici:
+                self.run(create_indexes)
+                self.conn.commit()
+        elif self.checkpoints is not None:
+            print("Caricamento interrotto: i blocchi già confermati restano nel database, "
+                  "rieseguire con --delta per riprendere.")
+        self.cur.close()
+        self.conn.close()
+
+def create_sink(delta=False):
+    return PostgresSink(delta=delta)
 
 if __name__ == "__main__":
-    reset_database()  
-    conn = connect_to_db()  
-    if conn:
-        create_tables(conn)  
-        csv_files = get_csv_files("./Datasets")  
-        insert_data_from_csv(conn, csv_files)  
-        conn.close() 
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--modalita', choices=['copy', 'righe', 'parallela'], default='copy',
+                        help="copy: COPY in tabella di appoggio e merge set-based; righe: un INSERT per riga; "
+                             "parallela: un processo (e una connessione) per file, poi un unico merge")
+    parser.add_argument('--processi', type=int, default=os.cpu_count(),
+                        help="Numero di processi per la modalità parallela")
+    parser.add_argument('--delta', action='store_true',
+                        help="Carica solo i file nuovi o modificati rispetto al manifest (non con --modalita parallela)")
+    parser.add_argument('--senza-indici', action='store_true',
+                        help="Non crea gli indici secondari e le statistiche dopo il caricamento")
+    parser.add_argument('--partizionato', action='store_true',
+                        help="Tabelle partizionate per mese dell'incidente: ogni file viene caricato in tabelle "
+                             "a parte e agganciato con ATTACH PARTITION (solo con --modalita copy)")
+    parser.add_argument('--report', metavar='PERCORSO',
+                        help="File JSON con le metriche del caricamento (default ./reports/caricamento_<data>.json)")
+    args = parser.parse_args()
+    if args.delta and args.modalita == 'parallela':
+        parser.error("--delta non è disponibile con --modalita parallela")
+    if args.partizionato and args.modalita != 'copy':
+        parser.error("--partizionato è disponibile solo con --modalita copy")
+
+    csv_files = get_csv_files("./Datasets")
+    if args.modalita == 'parallela':
+        insert_data_parallel(csv_files, args.processi, not args.senza_indici, args.report)
+    else:
+        sink = PostgresSink(args.modalita, args.delta, not args.senza_indici, args.partizionato)
+        run_pipeline(csv_files, [sink], report_path=args.report)
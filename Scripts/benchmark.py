@@ -0,0 +1,455 @@
+import argparse
+import json
+import math
+import os
+import subprocess
+import time
+from datetime import datetime
+from itertools import combinations
+import numpy as np
+import psycopg2
+from neo4j import GraphDatabase
+from load_metrics import REPORT_DIR, percentile
+from query_catalog import GRAPH_VERSIONS, QUERIES, QUERIES_BY_ID, cypher_query, sql_query
+from result_fingerprint import ResultFingerprint
+
+# Benchmark delle query di confronto. Ogni query viene misurata in due fasi:
+# - a freddo: prima di ogni esecuzione le cache dei piani vengono svuotate (nuova connessione PostgreSQL,
+#   db.clearQueryCaches() in Neo4j) e, se indicato, viene eseguito un comando esterno che svuota anche le
+#   cache dei dati (riavvio dei servizi, drop della page cache);
+# - a caldo: alcune iterazioni di riscaldamento vengono scartate, poi si misurano N ripetizioni.
+# Ogni target esegue la variante del catalogo (query_catalog.py) scritta per il proprio motore e la propria
+# versione del grafo. La fase a freddo di tutte le query precede quella a caldo.
+# Ogni esecuzione produce lo stesso record di tempi con entrambi i driver (TIMINGS): primo record,
+# trasferimento del resto del risultato, CPU del client spesa a decodificare le righe e tempo totale sono
+# misurati allo stesso modo sul client e si possono confrontare tra i motori. 'planning' e 'server'
+# (ENGINE_TIMINGS) misurano invece cose diverse nei due motori e valgono solo tra target dello stesso motore:
+# - planning: DECLARE del cursore PostgreSQL (analisi e pianificazione); in Neo4j la risposta al RUN, che
+#   arriva dopo l'esecuzione fino al primo record (per le query eager, con ORDER BY, aggregazioni o
+#   DISTINCT, quasi tutto il lavoro);
+# - server: per Neo4j result_available_after + result_consumed_after, che comprende l'invio delle righe al
+#   client; per PostgreSQL Planning + Execution Time di EXPLAIN ANALYZE, un'esecuzione a parte (dopo ogni
+#   ripetizione a caldo) che scarta le righe.
+# Per ogni query, motore, versione e tempo il report riporta min/mediana/media/p95/p99/deviazione standard e
+# l'intervallo di confidenza bootstrap della mediana. Ogni coppia di target viene confrontata con il test di
+# Mann-Whitney sul tempo scelto con --tempo (il totale lato client se non indicato) e le differenze non
+# significative vengono segnalate. Durante la prima esecuzione di riscaldamento viene calcolata l'impronta
+# del risultato (result_fingerprint.py): i target che restituiscono righe diverse da PostgreSQL vengono
+# segnalati accanto ai tempi, perché il confronto non riguarda la stessa risposta.
+
+PHASES = ('cold', 'warm')
+PHASE_NAMES = {'cold': 'a freddo', 'warm': 'a caldo'}
+TIMINGS = ('planning', 'first_row', 'transfer', 'decode', 'server', 'total')
+# Tempi che non si possono confrontare tra PostgreSQL e Neo4j
+ENGINE_TIMINGS = ('planning', 'server')
+TIMING_NAMES = {
+    'planning': 'invio e pianificazione (client, specifico del motore)',
+    'first_row': 'primo record (client)',
+    'transfer': 'trasferimento dopo il primo record (client)',
+    'decode': 'decodifica delle righe (CPU client)',
+    'server': 'tempo dichiarato dal server (specifico del motore)',
+    'total': 'totale fino all\'ultimo record (client)'
+}
+BOOTSTRAP_RESAMPLES = 2000
+# Righe lette per ogni FETCH del cursore lato server PostgreSQL
+FETCH_SIZE = 2000
+
+def connect_postgres():
+    return psycopg2.connect(
+        dbname="incidenti",
+        user="postgres",
+        password="admin",
+        host="localhost",
+        port="5432"
+    )
+
+def stream_rows(rows, start, planned, on_row=None):
+    # Legge il risultato registrando l'arrivo del primo record; la CPU del processo durante la lettura è
+    # il lavoro del driver per decodificare le righe, il resto del trasferimento è attesa di rete e server
+    cpu = time.process_time()
+    first_row = None
+    for row in rows:
+        if first_row is None:
+            first_row = time.perf_counter()
+        if on_row is not None:
+            on_row(row)
+    end = time.perf_counter()
+    first_row = first_row or end
+    return {
+        'planning': planned - start,
+        'first_row': first_row - start,
+        'transfer': end - first_row,
+        'decode': time.process_time() - cpu,
+        'server': None,
+        'total': end - start
+    }
+
+class PostgresTarget:
+    def __init__(self, queries):
+        self.name = 'PostgreSQL'
+        self.engine = 'postgres'
+        self.version = None
+        self.queries = queries
+        self.conn = None
+
+    def reset(self):
+        # Un nuovo backend non ha piani né cataloghi in cache
+        self.close()
+        self.conn = connect_postgres()
+        # Un cursore dichiarato viene pianificato per restituire presto il primo 10% delle righe
+        # (cursor_tuple_fraction = 0.1): con 1.0 il piano è quello di una normale esecuzione e di EXPLAIN
+        # ANALYZE. Il SET va confermato, altrimenti il rollback dopo ogni esecuzione lo annullerebbe
+        with self.conn.cursor() as cur:
+            cur.execute("SET cursor_tuple_fraction = 1.0")
+        self.conn.commit()
+
+    def execute(self, query, params, fingerprint=None):
+        if self.conn is None:
+            self.reset()
+        try:
+            # Cursore lato server: le righe arrivano a blocchi di FETCH_SIZE, come i record di Neo4j
+            with self.conn.cursor(name='benchmark') as cur:
+                cur.itersize = FETCH_SIZE
+                start = time.perf_counter()
+                # DECLARE: analisi e pianificazione, le righe arrivano con le FETCH
+                cur.execute(query, params or None)
+                planned = time.perf_counter()
+                on_row = None
+                if fingerprint is not None:
+                    on_row = lambda row: fingerprint.add([column.name for column in cur.description], row)
+                return stream_rows(cur, start, planned, on_row)
+        finally:
+            # Solo letture: la transazione del cursore viene chiusa subito
+            self.conn.rollback()
+
+    def server_time(self, query, params):
+        # PostgreSQL non riporta i tempi del server per una normale esecuzione: vengono letti da
+        # EXPLAIN ANALYZE (senza i timer per nodo, che ne rallentano l'esecuzione)
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute(f"EXPLAIN (ANALYZE, TIMING OFF, FORMAT JSON) {query}", params or None)
+                plan = cur.fetchone()[0][0]
+                return (plan['Planning Time'] + plan['Execution Time']) / 1000
+        finally:
+            self.conn.rollback()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+class Neo4jTarget:
+    def __init__(self, driver, database, queries):
+        self.name = f"Neo4j V{database[len('version'):]}"
+        self.engine = 'neo4j'
+        self.version = database
+        self.driver = driver
+        self.queries = queries
+
+    def reset(self):
+        self.driver.execute_query("CALL db.clearQueryCaches()", database_=self.version)
+
+    def execute(self, query, params, fingerprint=None):
+        # Stessa misura di PostgreSQL: tempo del client fino all'ultimo record ricevuto
+        with self.driver.session(database=self.version) as session:
+            start = time.perf_counter()
+            # session.run attende la risposta al RUN (result_available_after): oltre alla pianificazione
+            # comprende l'esecuzione fino al primo record, quindi non è la 'planning' di PostgreSQL
+            result = session.run(query, params)
+            planned = time.perf_counter()
+            on_row = None
+            if fingerprint is not None:
+                on_row = lambda record: fingerprint.add(record.keys(), record.values())
+            timing = stream_rows(result, start, planned, on_row)
+            summary = result.consume()
+            # Comprende l'invio delle righe al client, a differenza di EXPLAIN ANALYZE in PostgreSQL
+            if summary.result_available_after is not None and summary.result_consumed_after is not None:
+                timing['server'] = (summary.result_available_after + summary.result_consumed_after) / 1000
+            return timing
+
+    def server_time(self, query, params):
+        # Già nel riepilogo di ogni esecuzione
+        return None
+
+    def close(self):
+        pass
+
+def bootstrap_interval(values, confidence, resamples=BOOTSTRAP_RESAMPLES):
+    # Intervallo percentile bootstrap della mediana; il seme fisso rende il report riproducibile
+    if len(values) < 2:
+        return None, None
+    rng = np.random.default_rng(0)
+    medians = np.median(rng.choice(np.asarray(values), size=(resamples, len(values))), axis=1)
+    tail = (1 - confidence) / 2
+    low, high = np.quantile(medians, [tail, 1 - tail])
+    return float(low), float(high)
+
+def sample_summary(values, confidence):
+    if not values:
+        return {'n': 0}
+    ordered = sorted(values)
+    low, high = bootstrap_interval(ordered, confidence)
+    milliseconds = lambda value: None if value is None else round(value * 1000, 3)
+    return {
+        'n': len(ordered),
+        'min_ms': milliseconds(ordered[0]),
+        'median_ms': milliseconds(float(np.median(ordered))),
+        'mean_ms': milliseconds(float(np.mean(ordered))),
+        'p95_ms': milliseconds(percentile(ordered, 0.95)),
+        'p99_ms': milliseconds(percentile(ordered, 0.99)),
+        'stddev_ms': milliseconds(float(np.std(ordered, ddof=1)) if len(ordered) > 1 else None),
+        'ci_low_ms': milliseconds(low),
+        'ci_high_ms': milliseconds(high)
+    }
+
+def mann_whitney(first, second):
+    # Test U di Mann-Whitney a due code (approssimazione normale, correzione per pareggi e continuità):
+    # non assume che le latenze abbiano una distribuzione normale. Restituisce il p-value.
+    n1, n2 = len(first), len(second)
+    if n1 < 2 or n2 < 2:
+        return None
+    combined = np.concatenate([np.asarray(first, dtype=float), np.asarray(second, dtype=float)])
+    _, inverse, counts = np.unique(combined, return_inverse=True, return_counts=True)
+    # Rango medio dei valori uguali
+    ranks = (np.cumsum(counts) - (counts - 1) / 2.0)[inverse]
+    u = ranks[:n1].sum() - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - (counts ** 3 - counts).sum() / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = max(abs(u - n1 * n2 / 2) - 0.5, 0.0) / math.sqrt(variance)
+    return math.erfc(z / math.sqrt(2))
+
+def measure_cold(target, query_id, query, params, runs, cold_command):
+    samples = []
+    for _ in range(runs):
+        if cold_command:
+            subprocess.run(cold_command, shell=True, check=True)
+        target.reset()
+        samples.append(target.execute(query, params))
+    return {'cold': samples}
+
+def measure_warm(target, query_id, query, params, warmup, repetitions):
+    # L'impronta viene calcolata durante un'esecuzione di riscaldamento (o una in più se non ce ne sono),
+    # così le ripetizioni misurate non includono il tempo dell'hash
+    fingerprint = ResultFingerprint(QUERIES_BY_ID[query_id].get('fields'))
+    target.execute(query, params, fingerprint)
+    for _ in range(warmup - 1):
+        target.execute(query, params)
+    timings = [target.execute(query, params) for _ in range(repetitions)]
+    # Tempi del server per i motori che non li riportano insieme al risultato
+    for timing in timings:
+        if timing['server'] is None:
+            timing['server'] = target.server_time(query, params)
+    return {'warm': timings, 'result': fingerprint.summary()}
+
+def run_phase(targets, phase, samples, errors, measure):
+    for target in targets:
+        for query_id, query, params in target.queries:
+            if query_id in errors.get(target.name, {}):
+                continue
+            print(f"{target.name}: {QUERIES_BY_ID[query_id]['name']} ({PHASE_NAMES[phase]})")
+            try:
+                values = measure(target, query_id, query, params)
+            except Exception as e:
+                print(f"Errore nell'esecuzione della query {query_id} su {target.name}: {e}")
+                errors.setdefault(target.name, {})[query_id] = str(e)
+                # PostgreSQL si riconnette alla prossima esecuzione
+                target.close()
+                continue
+            samples.setdefault(query_id, {}).setdefault(target.name, {}).update(values)
+
+def timing_values(timings, timing):
+    return [values[timing] for values in timings if values[timing] is not None]
+
+def compare(samples, alpha, timing):
+    comparisons = []
+    for query_id, by_target in samples.items():
+        for phase in PHASES:
+            measured = [
+                (name, timing_values(values.get(phase, []), timing)) for name, values in by_target.items()
+            ]
+            measured = [(name, values) for name, values in measured if values]
+            for (first, first_values), (second, second_values) in combinations(measured, 2):
+                p_value = mann_whitney(first_values, second_values)
+                comparisons.append({
+                    'query': query_id,
+                    'phase': phase,
+                    'timing': timing,
+                    'first': first,
+                    'second': second,
+                    # > 1: il primo target è più lento del secondo
+                    'median_ratio': round(float(np.median(first_values) / np.median(second_values)), 3),
+                    'p_value': None if p_value is None else round(p_value, 6),
+                    'significant': p_value is not None and p_value < alpha
+                })
+    return comparisons
+
+def compare_results(samples, reference='PostgreSQL'):
+    # Confronta le impronte con quella di PostgreSQL (o del primo target che ha risposto)
+    mismatches = []
+    for query_id, by_target in samples.items():
+        results = [(name, values['result']) for name, values in by_target.items() if 'result' in values]
+        if not results:
+            continue
+        expected_name, expected = next(
+            ((name, result) for name, result in results if name == reference), results[0]
+        )
+        for name, result in results:
+            values = by_target[name]
+            values['reference'] = expected_name
+            values['matches_reference'] = result['fingerprint'] == expected['fingerprint']
+            if not values['matches_reference']:
+                mismatches.append({
+                    'query': query_id, 'target': name, 'rows': result['rows'], 'fingerprint': result['fingerprint'],
+                    'reference': expected_name, 'reference_rows': expected['rows'],
+                    'reference_fingerprint': expected['fingerprint']
+                })
+    return mismatches
+
+def run_benchmark(targets, warmup=3, repetitions=20, cold_runs=3, cold_command=None, confidence=0.95,
+                  alpha=0.05, timing='total'):
+    if timing in ENGINE_TIMINGS and len({target.engine for target in targets}) > 1:
+        raise ValueError(f"Il tempo '{timing}' è specifico del motore: non confronta PostgreSQL e Neo4j")
+    started_at = datetime.now()
+    samples = {}
+    errors = {}
+    try:
+        if cold_runs:
+            run_phase(targets, 'cold', samples, errors, lambda target, *query: measure_cold(
+                target, *query, cold_runs, cold_command
+            ))
+        if repetitions:
+            run_phase(targets, 'warm', samples, errors, lambda target, *query: measure_warm(
+                target, *query, warmup, repetitions
+            ))
+    finally:
+        for target in targets:
+            target.close()
+    mismatches = compare_results(samples)
+
+    descriptions = {target.name: {'engine': target.engine, 'version': target.version} for target in targets}
+    queries = {}
+    for query in QUERIES:
+        by_target = samples.get(query['id'])
+        if not by_target:
+            continue
+        queries[query['id']] = {
+            'name': query['name'],
+            'targets': {
+                name: dict(descriptions[name], **{
+                    phase: {
+                        kind: sample_summary(timing_values(values.get(phase, []), kind), confidence)
+                        for kind in TIMINGS
+                    }
+                    for phase in PHASES
+                }, **{key: values[key] for key in ('result', 'reference', 'matches_reference') if key in values})
+                for name, values in by_target.items()
+            }
+        }
+    return {
+        'started_at': started_at.isoformat(timespec='seconds'),
+        'settings': {
+            'warmup': warmup, 'repetitions': repetitions, 'cold_runs': cold_runs, 'cold_command': cold_command,
+            'confidence': confidence, 'alpha': alpha, 'timing': timing
+        },
+        # Descrizione dei tempi di ogni esecuzione; i confronti e i grafici usano settings.timing
+        'timings': TIMING_NAMES,
+        'queries': queries,
+        'comparisons': compare(samples, alpha, timing),
+        'result_mismatches': mismatches,
+        'errors': errors
+    }
+
+def default_targets(driver, query_ids=None):
+    query_ids = query_ids or [query['id'] for query in QUERIES]
+    postgres = PostgresTarget([(query_id, *sql_query(query_id)) for query_id in query_ids])
+    return [postgres] + [
+        Neo4jTarget(driver, version, [(query_id, *cypher_query(query_id, version)) for query_id in query_ids])
+        for version in GRAPH_VERSIONS
+    ]
+
+def print_report(report):
+    timing = report['settings']['timing']
+    print(f"Tempo confrontato: {TIMING_NAMES[timing]}")
+    for query_id, query in report['queries'].items():
+        print(f"{query_id}: {query['name']}")
+        for name, summary in query['targets'].items():
+            if 'result' in summary:
+                check = 'uguale a' if summary['matches_reference'] else 'DIVERSO da'
+                print(f"  {name:<11} risultato: {summary['result']['rows']} righe, {check} {summary['reference']}")
+            for phase in PHASES:
+                values = summary[phase][timing]
+                if not values['n']:
+                    continue
+                print(
+                    f"  {name:<11} {PHASE_NAMES[phase]:<8} n={values['n']:<3} min {values['min_ms']} ms, "
+                    f"mediana {values['median_ms']} ms [{values['ci_low_ms']}, {values['ci_high_ms']}], "
+                    f"p95 {values['p95_ms']} ms, p99 {values['p99_ms']} ms, dev. std. {values['stddev_ms']} ms"
+                )
+                # Mediane di tutti i tempi della stessa esecuzione
+                medians = ', '.join(
+                    f"{kind} {summary[phase][kind]['median_ms']}" for kind in TIMINGS if summary[phase][kind]['n']
+                )
+                print(f"  {'':<11} {'':<8} mediane (ms): {medians}")
+    not_significant = [comparison for comparison in report['comparisons'] if not comparison['significant']]
+    if not_significant:
+        print(f"Differenze non significative ({TIMING_NAMES[timing]}):")
+        for comparison in not_significant:
+            print(
+                f"  {comparison['query']} ({PHASE_NAMES[comparison['phase']]}): {comparison['first']} vs "
+                f"{comparison['second']}, rapporto delle mediane {comparison['median_ratio']}, "
+                f"p = {comparison['p_value']}"
+            )
+
+    if report['result_mismatches']:
+        print("Risultati diversi (i tempi non confrontano la stessa risposta):")
+        for mismatch in report['result_mismatches']:
+            print(
+                f"  {mismatch['query']}: {mismatch['target']} {mismatch['rows']} righe ({mismatch['fingerprint']}), "
+                f"{mismatch['reference']} {mismatch['reference_rows']} righe ({mismatch['reference_fingerprint']})"
+            )
+
+def write_report(report, report_path=None):
+    if report_path is None:
+        started_at = datetime.fromisoformat(report['started_at'])
+        report_path = os.path.join(REPORT_DIR, f"benchmark_{started_at:%Y%m%d_%H%M%S}.json")
+    directory = os.path.dirname(report_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(report_path, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2, ensure_ascii=False)
+    return report_path
+
+def add_arguments(parser):
+    parser.add_argument('--warmup', type=int, default=3, help="Esecuzioni di riscaldamento scartate (fase a caldo)")
+    parser.add_argument('--ripetizioni', type=int, default=20, help="Esecuzioni misurate nella fase a caldo")
+    parser.add_argument('--freddo', type=int, default=3, help="Esecuzioni misurate nella fase a freddo")
+    parser.add_argument('--comando-freddo', help="Comando eseguito prima di ogni esecuzione a freddo "
+                        "(ad esempio il riavvio dei servizi e il drop della page cache)")
+    parser.add_argument('--confidenza', type=float, default=0.95, help="Livello degli intervalli di confidenza")
+    parser.add_argument('--alfa', type=float, default=0.05, help="Soglia di significatività dei confronti")
+    parser.add_argument('--query', nargs='+', choices=list(QUERIES_BY_ID), help="Id delle query da eseguire (default: tutte)")
+    # planning e server restano nel report, ma non si confrontano tra PostgreSQL e Neo4j
+    parser.add_argument('--tempo', choices=[timing for timing in TIMINGS if timing not in ENGINE_TIMINGS],
+                        default='total', help="Tempo usato per i confronti e i grafici (default: totale lato "
+                        "client); planning e server sono specifici del motore e compaiono solo nel report")
+    parser.add_argument('--report', help="Percorso del report JSON (default: reports/benchmark_<data>.json)")
+
+def run_from_arguments(args):
+    driver = GraphDatabase.driver("bolt://localhost:7687", auth=("neo4j", "adminadmin"))
+    try:
+        report = run_benchmark(
+            default_targets(driver, args.query), args.warmup, args.ripetizioni, args.freddo, args.comando_freddo,
+            args.confidenza, args.alfa, args.tempo
+        )
+    finally:
+        driver.close()
+    print_report(report)
+    print(f"Report del benchmark: {write_report(report, args.report)}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    run_from_arguments(parser.parse_args())
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+from incidenti_csv import (
+    CACHE_DIR, CHUNK_SIZE, FIELD_TYPES, RECORD_FIELDS, IncidentRecord, detect_encoding,
+    align_chunks, file_checksum, file_month, read_incident_columns, records_from_columns, to_bool, to_datetime,
+    to_float, to_int
+)
+
+# Cache colonnare dei CSV già puliti e convertiti: una cartella per file in .cache/colonne (mese più un hash
+# del percorso, così due cartelle del dataset non si sovrascrivono la cache) con un segmento per blocco letto
+# e, in ogni segmento, un file .npy per colonna, letto in memory-map. I campi di testo sono codificati a
+# dizionario (codici int32 più l'elenco dei valori distinti), i campi vuoti sono una maschera a parte. La
+# cache viene ricostruita quando il CSV cambia (dimensione, mtime e, se questi differiscono, checksum) o
+# quando cambia il formato dei record. iter_incident_chunks restituisce gli stessi IncidentRecord della
+# lettura del CSV, in blocchi che non dividono un incidente.
+
+COLUMN_CACHE_DIR = os.path.join(CACHE_DIR, 'colonne')
+# Da incrementare quando cambiano la conversione dei campi o il formato dei file
+CACHE_VERSION = 3
+
+COLUMN_TYPES = {to_int: 'int', to_float: 'float', to_bool: 'bool', to_datetime: 'datetime'}
+COLUMN_KINDS = {field: COLUMN_TYPES.get(FIELD_TYPES.get(field), 'text') for field in RECORD_FIELDS}
+COLUMN_KINDS['idpersona'] = 'int'
+DTYPES = {'int': np.int64, 'float': np.float64, 'bool': np.bool_}
+
+def cache_path(file_path):
+    year, month = file_month(file_path)
+    source = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(COLUMN_CACHE_DIR, f"{year}_{month:02d}_{source}")
+
+def segment_path(directory, index):
+    return os.path.join(directory, f"{index:05d}")
+
+def read_meta(directory):
+    try:
+        with open(os.path.join(directory, 'meta.json'), 'r', encoding='utf-8') as meta_file:
+            return json.load(meta_file)
+    except (OSError, ValueError):
+        return None
+
+def write_meta(directory, meta):
+    tmp_path = os.path.join(directory, f"meta.json.{os.getpid()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as meta_file:
+        json.dump(meta, meta_file, indent=2)
+    os.replace(tmp_path, os.path.join(directory, 'meta.json'))
+
+def source_meta(file_path):
+    stat = os.stat(file_path)
+    return {
+        'source': os.path.abspath(file_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+        'version': CACHE_VERSION, 'fields': RECORD_FIELDS
+    }
+
+def is_valid(directory, file_path):
+    meta = read_meta(directory)
+    if meta is None:
+        return False
+    current = source_meta(file_path)
+    if any(meta.get(key) != current[key] for key in ('source', 'size', 'version', 'fields')):
+        return False
+    if meta['mtime_ns'] == current['mtime_ns']:
+        return True
+    # File toccato ma non modificato: basta aggiornare l'mtime nella cache
+    if meta.get('checksum') == file_checksum(file_path):
+        write_meta(directory, dict(meta, mtime_ns=current['mtime_ns']))
+        return True
+    return False
+
+def source_checksum(file_path):
+    # Checksum del CSV dalla cache, se dimensione e mtime non sono cambiati
+    meta = read_meta(cache_path(file_path))
+    current = source_meta(file_path)
+    if meta is not None and all(meta.get(key) == current[key] for key in ('source', 'size', 'mtime_ns')):
+        return meta['checksum']
+    return file_checksum(file_path)
+
+def encode_column(kind, values):
+    # Restituisce i file .npy della colonna
+    if kind == 'text':
+        dictionary = {}
+        codes = np.fromiter(
+            (-1 if value is None else dictionary.setdefault(value, len(dictionary)) for value in values),
+            dtype=np.int32, count=len(values)
+        )
+        return {'codes': codes, 'dict': np.array(list(dictionary), dtype=str)}
+    if kind == 'datetime':
+        # NaT rappresenta il campo vuoto
+        return {'data': np.array(values, dtype='datetime64[s]')}
+    null = np.fromiter((value is None for value in values), dtype=np.bool_, count=len(values))
+    fill = DTYPES[kind](0)
+    data = np.array([fill if value is None else value for value in values], dtype=DTYPES[kind])
+    return {'data': data, 'null': null} if null.any() else {'data': data}
+
+def write_segment(directory, columns):
+    os.makedirs(directory)
+    for field, values in zip(RECORD_FIELDS, columns):
+        for part, array in encode_column(COLUMN_KINDS[field], values).items():
+            np.save(os.path.join(directory, f"{field}.{part}.npy"), array)
+
+def load_columns(directory):
+    columns = []
+    for field in RECORD_FIELDS:
+        parts = {}
+        for part in ('data', 'null', 'codes', 'dict'):
+            path = os.path.join(directory, f"{field}.{part}.npy")
+            if os.path.exists(path):
+                # Il dizionario è piccolo e viene letto subito, le colonne restano mappate su disco
+                parts[part] = np.load(path, mmap_mode=None if part == 'dict' else 'r')
+        if 'dict' in parts:
+            # Il codice -1 (campo vuoto) indica l'ultimo elemento, None
+            parts['dict'] = np.array(parts['dict'].tolist() + [None], dtype=object)
+        columns.append(parts)
+    return columns
+
+def decode_column(parts, start, stop):
+    if 'codes' in parts:
+        return parts['dict'][parts['codes'][start:stop]].tolist()
+    data = parts['data'][start:stop]
+    if 'null' not in parts:
+        return data.tolist()
+    values = data.astype(object)
+    values[parts['null'][start:stop]] = None
+    return values.tolist()
+
+def iter_cached_chunks(directory, chunk_size):
+    # I blocchi restituiti hanno chunk_size righe anche se la cache è stata scritta con blocchi diversi
+    pending = []
+    for index, rows in enumerate(read_meta(directory)['segments']):
+        columns = load_columns(segment_path(directory, index))
+        for start in range(0, rows, chunk_size):
+            stop = min(start + chunk_size, rows)
+            values = [decode_column(parts, start, stop) for parts in columns]
+            pending.extend(map(IncidentRecord._make, zip(*values)))
+            if len(pending) >= chunk_size:
+                yield pending[:chunk_size]
+                pending = pending[chunk_size:]
+    if pending:
+        yield pending
+
+def build_cache(file_path, directory, chunk_size=CHUNK_SIZE):
+    # I record di ogni blocco vengono restituiti appena normalizzati, così la lettura si sovrappone alla
+    # scrittura nei sink anche quando la cache va ricostruita. Intanto il blocco viene scritto come segmento
+    # in una cartella temporanea (in memoria resta un blocco alla volta), che prende il posto della cache
+    # solo se la lettura arriva in fondo. Un errore di lettura arriva al chiamante (run_pipeline), che non
+    # considera completo il file
+    encoding = detect_encoding(file_path)
+    tmp_dir = f"{directory}.{os.getpid()}.tmp"
+    segments = []
+    try:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+    except OSError as e:
+        print(f"Cache colonnare non scritta per {file_path}: {e}")
+        tmp_dir = None
+    try:
+        for chunk in read_incident_columns(file_path, encoding, chunk_size):
+            if tmp_dir is not None:
+                try:
+                    write_segment(segment_path(tmp_dir, len(segments)), chunk)
+                    segments.append(len(chunk[0]))
+                except OSError as e:
+                    print(f"Cache colonnare non scritta per {file_path}: {e}")
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+                    tmp_dir = None
+            yield records_from_columns(chunk)
+        if tmp_dir is not None:
+            try:
+                meta = dict(source_meta(file_path), checksum=file_checksum(file_path), segments=segments)
+                write_meta(tmp_dir, meta)
+                shutil.rmtree(directory, ignore_errors=True)
+                os.replace(tmp_dir, directory)
+            except OSError as e:
+                print(f"Cache colonnare non scritta per {file_path}: {e}")
+    finally:
+        # Lettura interrotta (errore o blocchi non più richiesti): i segmenti scritti vengono eliminati
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def iter_incident_chunks(file_path, chunk_size=CHUNK_SIZE):
+    # I blocchi terminano sempre alla fine di un incidente (align_chunks)
+    directory = cache_path(file_path)
+    if is_valid(directory, file_path):
+        chunks = iter_cached_chunks(directory, chunk_size)
+    else:
+        chunks = build_cache(file_path, directory, chunk_size)
+    yield from align_chunks(chunks)
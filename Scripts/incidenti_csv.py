@@ -0,0 +1,398 @@
+import codecs
+import csv
+import functools
+import hashlib
+import itertools
+import json
+import os
+import re
+from collections import namedtuple
+from datetime import datetime
+import chardet
+import numpy as np
+
+def month_order_key(filename):
+    month_map = {
+        "Gennaio": 1,
+        "Febbraio": 2,
+        "Marzo": 3,
+        "Aprile": 4,
+        "Maggio": 5,
+        "Giugno": 6,
+        "Luglio": 7,
+        "Agosto": 8,
+        "Settembre": 9,
+        "Ottobre": 10,
+        "Novembre": 11,
+        "Dicembre": 12
+    }
+
+    month = re.search(r'csv_incidenti(.*?).csv', filename)
+    if month:
+        month_name = month.group(1).strip()
+        return month_map.get(month_name, 0)
+    return 0
+
+def get_csv_files(base_directory):
+    csv_files = []
+    for dirpath, _, filenames in os.walk(base_directory):
+        year = os.path.basename(dirpath)
+        if year.isdigit():
+            for filename in filenames:
+                if filename.endswith('.csv'):
+                    csv_files.append((year, filename))
+
+    csv_files.sort(key=lambda x: (int(x[0]), month_order_key(x[1])))
+    return [os.path.join(base_directory, x[0], x[1]) for x in csv_files]
+
+def file_month(file_path):
+    #Anno e mese di un file mensile (Datasets/<anno>/csv_incidenti<Mese>.csv)
+    year = int(os.path.basename(os.path.dirname(os.path.normpath(file_path))))
+    return year, month_order_key(os.path.basename(file_path))
+
+def month_code(file_path):
+    #aaaamm del file mensile, es. 202110 per Datasets/2021/csv_incidentiOttobre.csv
+    year, month = file_month(file_path)
+    return year * 100 + month
+
+def dataset_key(file_path):
+    #Chiave di un file mensile nei manifest: il percorso relativo alla cartella del dataset (<anno>/<file>),
+    #lo stesso da qualunque cartella venga lanciato il caricamento
+    path = os.path.normpath(file_path)
+    return f"{os.path.basename(os.path.dirname(path))}/{os.path.basename(path)}"
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache')
+ENCODING_CACHE = os.path.join(CACHE_DIR, 'encodings.json')
+SAMPLE_SIZE = 64 * 1024
+
+# Parole che in alcuni mesi arrivano già rovinate dall'export (carattere sostituito con U+FFFD)
+MOJIBAKE_REPAIRS = {
+    'Pi\ufffd': 'Più',
+    'prossimit\ufffd': 'prossimità',
+    'umidit\ufffd': 'umidità',
+}
+MOJIBAKE_PATTERN = re.compile('|'.join(re.escape(word) for word in MOJIBAKE_REPAIRS))
+
+def load_encoding_cache():
+    try:
+        with open(ENCODING_CACHE, 'r', encoding='utf-8') as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+
+def save_encoding_cache(cache):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{ENCODING_CACHE}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as cache_file:
+        json.dump(cache, cache_file, indent=2)
+    os.replace(tmp_path, ENCODING_CACHE)
+
+def read_sample(file_path):
+    # Basta il primo blocco che contiene byte non ASCII: è lì che le codifiche si distinguono
+    with open(file_path, 'rb') as file:
+        sample = b''
+        while True:
+            block = file.read(SAMPLE_SIZE)
+            if not block:
+                return sample
+            sample += block
+            if not block.isascii():
+                return sample + file.readline()
+
+def sniff_encoding(sample):
+    if sample.isascii():
+        return 'utf-8'
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    result = chardet.detect(sample)
+    return result['encoding'] or 'latin-1'
+
+def detect_encoding(file_path):
+    stat = os.stat(file_path)
+    key = os.path.abspath(file_path)
+    cache = load_encoding_cache()
+    entry = cache.get(key)
+    if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+        return entry['encoding']
+
+    encoding = sniff_encoding(read_sample(file_path))
+    cache[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'encoding': encoding}
+    save_encoding_cache(cache)
+    return encoding
+
+def file_checksum(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def repair_mojibake(line):
+    if '\ufffd' not in line:
+        return line
+    return MOJIBAKE_PATTERN.sub(lambda match: MOJIBAKE_REPAIRS[match.group(0)], line)
+
+def clean_key(key):
+    return key.strip().replace(' ', '_').lower()
+
+# Colonne del dataset (nomi normalizzati) nell'ordine dei file CSV
+FIELDS = [
+    'protocollo', 'gruppo', 'dataoraincidente', 'localizzazione1', 'strada1', 'localizzazione2',
+    'strada2', 'strada02', 'chilometrica', 'daspecificare', 'naturaincidente', 'particolaritastrade',
+    'tipostrada', 'fondostradale', 'pavimentazione', 'segnaletica', 'condizioneatmosferica', 'traffico',
+    'visibilita', 'illuminazione', 'num_feriti', 'num_riservata', 'num_morti', 'num_illesi', 'longitude',
+    'latitude', 'confermato', 'progressivo', 'tipoveicolo', 'statoveicolo', 'tipopersona', 'sesso',
+    'tipolesione', 'deceduto', 'decedutodopo', 'cinturacascoutilizzato', 'airbag'
+]
+
+# Ogni record ha in più l'id della persona, calcolato dalla riga stessa: mese del file (aaaamm), protocollo
+# e posizione della riga tra quelle dello stesso incidente nel file, es. 2021100525059501 per la prima persona
+# del protocollo 5250595 di Ottobre 2021. Il mese serve perché il dataset riusa alcuni protocolli in mesi
+# diversi per incidenti diversi. L'id non dipende dall'ordine in cui vengono caricati i file ed è lo stesso
+# in PostgreSQL e in Neo4j.
+RECORD_FIELDS = FIELDS + ['idpersona']
+PERSONE_PER_INCIDENTE = 100
+PROTOCOLLI_PER_MESE = 10 ** 8
+
+IncidentRecord = namedtuple('IncidentRecord', RECORD_FIELDS)
+
+CHUNK_SIZE = 5000
+
+# Conversione dei valori letti dal CSV: i campi elencati diventano numeri, booleani o date, gli altri
+# restano testo. In tutti i casi il campo vuoto (o un valore non convertibile) diventa None.
+DATE_FORMATS = ['%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y']
+
+def to_text(value):
+    return value or None
+
+def to_int(value):
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+def to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+def to_bool(value):
+    #Nell'export -1 significa vero e 0 falso
+    if value in ('-1', '1'):
+        return True
+    if value == '0':
+        return False
+    return None
+
+# Forma usata in tutti i file (gg/mm/aaaa hh:mm[:ss]): viene costruita direttamente, senza strptime;
+# tutto il resto (e le date non valide) passa per DATE_FORMATS
+DATE_PATTERN = re.compile(r'([0-9]{2})/([0-9]{2})/([0-9]{4})(?: ([0-9]{2}):([0-9]{2})(?::([0-9]{2}))?)?')
+
+@functools.lru_cache(maxsize=65536)
+def to_datetime(value):
+    match = DATE_PATTERN.fullmatch(value)
+    if match is not None:
+        try:
+            return datetime(*(int(part) for part in match.group(3, 2, 1, 4, 5, 6) if part is not None))
+        except ValueError:
+            pass
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+    return None
+
+# Date convertite in blocco con numpy: per ogni lunghezza accettata, la posizione nel testo originale di ogni
+# carattere della forma ISO aaaa-mm-ggThh:mm:ss (le stringhe indicano caratteri fissi)
+ISO_LAYOUTS = {
+    19: [6, 7, 8, 9, '-', 3, 4, '-', 0, 1, 'T', 11, 12, ':', 14, 15, ':', 17, 18],
+    16: [6, 7, 8, 9, '-', 3, 4, '-', 0, 1, 'T', 11, 12, ':', 14, 15, ':', '0', '0'],
+    10: [6, 7, 8, 9, '-', 3, 4, '-', 0, 1, 'T', '0', '0', ':', '0', '0', ':', '0', '0'],
+}
+DATE_SEPARATORS = {2: '/', 5: '/', 10: ' ', 13: ':', 16: ':'}
+
+def parse_dates(values):
+    # values: testi distinti, già ripuliti e non vuoti. Vengono convertiti con numpy solo quelli che
+    # superano il confronto con la conversione inversa (data esistente, ore e minuti validi); gli altri
+    # passano per to_datetime, che resta il riferimento
+    converted = {}
+    for size, layout in ISO_LAYOUTS.items():
+        block = [value for value in values if len(value) == size]
+        if not block:
+            continue
+        chars = np.array(block, dtype=f'U{size}').view('U1').reshape(len(block), size)
+        digits = [position for position in range(size) if position not in DATE_SEPARATORS]
+        separators = [position for position in DATE_SEPARATORS if position < size]
+        valid = ((chars[:, digits] >= '0') & (chars[:, digits] <= '9')).all(axis=1)
+        valid &= (chars[:, separators] == [DATE_SEPARATORS[position] for position in separators]).all(axis=1)
+        # L'anno 0 non esiste per datetime
+        valid &= (chars[:, 6:10] != '0').any(axis=1)
+        constants = sorted({item for item in layout if isinstance(item, str)})
+        source = np.concatenate([chars, np.broadcast_to(np.array(constants), (len(block), len(constants)))], axis=1)
+        order = [size + constants.index(item) if isinstance(item, str) else item for item in layout]
+        iso = np.ascontiguousarray(source[:, order]).view('U19').ravel()
+        try:
+            parsed = iso[valid].astype('datetime64[s]')
+            valid[valid] = np.datetime_as_string(parsed, unit='s') == iso[valid]
+            parsed = iso[valid].astype('datetime64[s]').tolist()
+        except ValueError:
+            valid[:] = False
+            parsed = []
+        converted.update(zip(itertools.compress(block, valid.tolist()), parsed))
+    for value in values:
+        if value not in converted:
+            converted[value] = to_datetime(value)
+    return converted
+
+FIELD_TYPES = {
+    'protocollo': to_int,
+    'gruppo': to_int,
+    'dataoraincidente': to_datetime,
+    'num_feriti': to_int,
+    'num_riservata': to_int,
+    'num_morti': to_int,
+    'num_illesi': to_int,
+    'longitude': to_float,
+    'latitude': to_float,
+    'confermato': to_bool,
+    'progressivo': to_int,
+    'deceduto': to_bool,
+}
+CONVERTERS = [FIELD_TYPES.get(field, to_text) for field in FIELDS]
+
+def persona_id_range(file_path):
+    #Intervallo [inizio, fine) degli id delle persone lette da un file mensile
+    inizio = month_code(file_path) * PROTOCOLLI_PER_MESE * PERSONE_PER_INCIDENTE
+    return inizio, inizio + PROTOCOLLI_PER_MESE * PERSONE_PER_INCIDENTE
+
+def persona_id(mese, protocollo, ordinale):
+    if not protocollo.isdigit():
+        return None
+    # Oltre questi limiti l'id non sarebbe più univoco: è un errore del file, segnalato come gli altri
+    # errori di lettura
+    if ordinale >= PERSONE_PER_INCIDENTE:
+        raise csv.Error(f"Incidente {protocollo} con più di {PERSONE_PER_INCIDENTE - 1} righe")
+    if int(protocollo) >= PROTOCOLLI_PER_MESE:
+        raise csv.Error(f"Protocollo {protocollo} con più di {len(str(PROTOCOLLI_PER_MESE)) - 1} cifre")
+    return (mese * PROTOCOLLI_PER_MESE + int(protocollo)) * PERSONE_PER_INCIDENTE + ordinale
+
+def convert_value(convert, value):
+    value = value.strip()
+    return convert(value) if value else None
+
+def convert_column(convert, column):
+    # Ogni valore distinto della colonna viene pulito e convertito una sola volta, poi il risultato
+    # viene distribuito sulle righe con una ricerca nel dizionario (map senza cicli Python per cella)
+    if convert is to_text:
+        converted = {value: value.strip() or None for value in set(column)}
+    elif convert is to_datetime:
+        stripped = {value: value.strip() for value in set(column)}
+        dates = parse_dates([value for value in set(stripped.values()) if value])
+        converted = {value: dates[text] if text else None for value, text in stripped.items()}
+    else:
+        converted = {value: convert_value(convert, value) for value in set(column)}
+    return list(map(converted.__getitem__, column))
+
+def ordinals(codes, totals):
+    # Posizione di ogni riga tra quelle dello stesso incidente (codes: indice del protocollo),
+    # continuando i conteggi dei blocchi precedenti (totals)
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    counts = np.diff(np.r_[starts, len(order)])
+    result = np.empty(len(order), dtype=np.int64)
+    result[order] = np.arange(len(order)) - np.repeat(starts, counts) + 1 + totals[sorted_codes]
+    totals[sorted_codes[starts]] += counts
+    return result
+
+def persona_ids(column, ordinali, mese):
+    protocolli = list(map(str.strip, column))
+    distinct = list(dict.fromkeys(protocolli))
+    index = {protocollo: code for code, protocollo in enumerate(distinct)}
+    codes = np.fromiter(map(index.__getitem__, protocolli), dtype=np.int64, count=len(protocolli))
+    totals = np.array([ordinali.get(protocollo, 0) for protocollo in distinct], dtype=np.int64)
+    ordinale = ordinals(codes, totals)
+    ordinali.update(zip(distinct, totals.tolist()))
+
+    base = np.array([int(key) if key.isdigit() else -1 for key in distinct], dtype=np.int64)[codes]
+    for largest in (int(ordinale.argmax()), int(base.argmax())):
+        if ordinale[largest] >= PERSONE_PER_INCIDENTE or base[largest] >= PROTOCOLLI_PER_MESE:
+            persona_id(mese, protocolli[largest], int(ordinale[largest]))
+    ids = ((mese * PROTOCOLLI_PER_MESE + base) * PERSONE_PER_INCIDENTE + ordinale).tolist()
+    for position in np.flatnonzero(base < 0).tolist():
+        ids[position] = None
+    return ids
+
+def normalize_columns(rows, positions, ordinali, mese):
+    # Normalizzazione a colonne di un blocco di righe grezze, con lo stesso risultato della conversione
+    # riga per riga: strip, campo vuoto -> None, conversione del tipo, id della persona.
+    # Restituisce una lista di valori per ogni campo di RECORD_FIELDS
+    width = max(position for position in positions if position is not None) + 1
+    # Alcuni mesi hanno righe più corte dell'intestazione: mancano gli ultimi campi
+    padded = [row if len(row) >= width else row + [''] * (width - len(row)) for row in rows]
+    table = list(zip(*padded))
+    empty = ('',) * len(rows)
+    columns = [
+        convert_column(convert, table[position] if position is not None else empty)
+        for convert, position in zip(CONVERTERS, positions)
+    ]
+    columns.append(persona_ids(table[positions[0]] if positions[0] is not None else empty, ordinali, mese))
+    return columns
+
+def records_from_columns(columns):
+    return list(map(IncidentRecord._make, zip(*columns)))
+
+READ_ERRORS = (OSError, UnicodeDecodeError, csv.Error, StopIteration)
+
+def read_incident_columns(file_path, encoding, chunk_size=CHUNK_SIZE):
+    # Blocchi di righe già normalizzati, a colonne; gli errori di lettura vengono propagati al chiamante
+    mese = month_code(file_path)
+    with open(file_path, mode='r', encoding=encoding, newline='') as incidents_file:
+        reader = csv.reader((repair_mojibake(line) for line in incidents_file), delimiter=';')
+        # StopIteration non può uscire da un generatore: il file vuoto diventa un errore del CSV
+        header = next(reader, None)
+        if header is None:
+            raise csv.Error("empty file")
+        header = [clean_key(key) for key in header]
+        # Posizione di ogni campo nel file (alcuni mesi hanno una colonna vuota in coda)
+        positions = [header.index(field) if field in header else None for field in FIELDS]
+        ordinali = {}
+        while True:
+            rows = []
+            try:
+                rows.extend(itertools.islice(reader, chunk_size))
+            except READ_ERRORS:
+                # Le righe lette prima dell'errore vengono comunque restituite, come nella lettura riga per riga
+                if rows:
+                    yield normalize_columns(rows, positions, ordinali, mese)
+                raise
+            if not rows:
+                return
+            yield normalize_columns(rows, positions, ordinali, mese)
+
+def group_incidents(records):
+    # Il CSV ha una riga per persona coinvolta: le righe consecutive con lo stesso protocollo formano
+    # un incidente, che i sink scrivono una volta sola (con i suoi veicoli e le sue persone)
+    return [list(rows) for _, rows in itertools.groupby(records, key=lambda record: record.protocollo)]
+
+def align_chunks(chunks):
+    # Le righe dell'ultimo incidente di un blocco passano al blocco successivo: nessun incidente viene
+    # diviso tra due blocchi (e quindi tra due transazioni)
+    carry = []
+    for chunk in chunks:
+        chunk = carry + chunk
+        cut = len(chunk)
+        while cut > 0 and chunk[cut - 1].protocollo == chunk[-1].protocollo:
+            cut -= 1
+        if cut == 0:
+            carry = chunk
+            continue
+        carry = chunk[cut:]
+        yield chunk[:cut]
+    if carry:
+        yield carry
@@ -0,0 +1,177 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+# Metriche di un caricamento: la pipeline misura lettura/normalizzazione dei CSV e il tempo passato in ogni
+# sink (wall e CPU del processo, la differenza è attesa di I/O), i sink registrano la latenza di ogni
+# statement o batch inviato al database. Alla fine tutto viene scritto in un report JSON, confrontabile
+# tra esecuzioni e versioni.
+
+REPORT_DIR = './reports'
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank su una lista già ordinata
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def sql_statement_name(query):
+    # "INSERT INTO persona_2020_01 AS persona (...)" -> "INSERT INTO persona": le partizioni mensili
+    # vengono raggruppate con la tabella padre
+    match = re.match(r'\s*(\w+)\s+(?:(INTO|TABLE|FROM)\s+)?(\w+)', query, re.IGNORECASE)
+    if match is None:
+        return query.strip()[:40]
+    name = ' '.join(part for part in match.groups() if part)
+    return re.sub(r'_\d{4}_\d{2}$', '', name)
+
+def rate(rows, seconds):
+    return round(rows / seconds, 1) if seconds else None
+
+def statement_summary(entry):
+    latencies = sorted(entry['latencies'])
+    summary = {
+        'calls': len(latencies),
+        'rows': entry['rows'],
+        'total_s': round(sum(latencies), 6),
+        'rows_per_s': rate(entry['rows'], sum(latencies)),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3)
+    }
+    if entry['server_s']:
+        # Tempo dichiarato dal server (Neo4j result_available_after + result_consumed_after):
+        # il resto della latenza è rete e driver
+        summary['server_s'] = round(entry['server_s'], 6)
+        summary['client_network_s'] = round(sum(latencies) - entry['server_s'], 6)
+    return summary
+
+def time_summary(entry):
+    return {
+        'rows': entry['rows'],
+        'wall_s': round(entry['wall_s'], 6),
+        'cpu_s': round(entry['cpu_s'], 6),
+        'io_wait_s': round(max(entry['wall_s'] - entry['cpu_s'], 0.0), 6),
+        'rows_per_s': rate(entry['rows'], entry['wall_s'])
+    }
+
+def new_times():
+    return {'rows': 0, 'wall_s': 0.0, 'cpu_s': 0.0}
+
+def new_statement():
+    return {'rows': 0, 'latencies': [], 'server_s': 0.0}
+
+class LoadMetrics:
+    # record() può essere chiamato dai thread di PartitionedWriter: le modifiche passano da un lock
+
+    def __init__(self, chunk_size=None):
+        self.lock = threading.Lock()
+        self.chunk_size = chunk_size
+        self.started_at = datetime.now()
+        self.started = time.perf_counter()
+        self.files = {}
+        self.errors = []
+        self.current_file = None
+
+    def file_entry(self, csv_file):
+        return self.files.setdefault(csv_file, {'parsing': new_times(), 'targets': {}, 'statements': {}})
+
+    def start_file(self, csv_file):
+        self.current_file = csv_file
+        self.file_entry(csv_file)
+
+    def end_file(self):
+        self.current_file = None
+
+    def add_file(self, csv_file, entry):
+        # Metriche di un file raccolte in un altro processo (v1.py --modalita parallela)
+        with self.lock:
+            self.files[csv_file] = entry
+
+    def add_parse(self, rows, wall, cpu):
+        parsing = self.file_entry(self.current_file)['parsing']
+        parsing['rows'] += rows
+        parsing['wall_s'] += wall
+        parsing['cpu_s'] += cpu
+
+    def add_load(self, target, rows, wall, cpu):
+        with self.lock:
+            times = self.file_entry(self.current_file)['targets'].setdefault(target, new_times())
+            times['rows'] += rows
+            times['wall_s'] += wall
+            times['cpu_s'] += cpu
+
+    def add_error(self, target, method, message):
+        # Errore che ha escluso un sink dal caricamento, o errore di lettura di un file (target None)
+        with self.lock:
+            self.errors.append({'target': target, 'file': self.current_file, 'method': method, 'error': message})
+
+    def record(self, target, statement, rows, seconds, server_seconds=None):
+        with self.lock:
+            statements = self.file_entry(self.current_file)['statements'].setdefault(target, {})
+            entry = statements.setdefault(statement, new_statement())
+            entry['rows'] += rows
+            entry['latencies'].append(seconds)
+            if server_seconds is not None:
+                entry['server_s'] += server_seconds
+
+    def summary(self):
+        totals_parsing = new_times()
+        totals_targets = {}
+        totals_statements = {}
+        files = []
+        for csv_file, entry in self.files.items():
+            for key in totals_parsing:
+                totals_parsing[key] += entry['parsing'][key]
+            for target, times in entry['targets'].items():
+                total = totals_targets.setdefault(target, new_times())
+                for key in total:
+                    total[key] += times[key]
+            for target, statements in entry['statements'].items():
+                for statement, values in statements.items():
+                    total = totals_statements.setdefault(target, {}).setdefault(statement, new_statement())
+                    total['rows'] += values['rows']
+                    total['latencies'].extend(values['latencies'])
+                    total['server_s'] += values['server_s']
+            files.append({
+                # None raccoglie ciò che avviene fuori dai file (vincoli, indici, chiusura)
+                'file': csv_file,
+                'parsing': time_summary(entry['parsing']),
+                'targets': {target: time_summary(times) for target, times in entry['targets'].items()},
+                'statements': {
+                    target: {statement: statement_summary(values) for statement, values in statements.items()}
+                    for target, statements in entry['statements'].items()
+                }
+            })
+
+        targets = {}
+        for target in sorted(set(totals_targets) | set(totals_statements)):
+            targets[target] = time_summary(totals_targets.get(target, new_times()))
+            targets[target]['statements'] = {
+                statement: statement_summary(values)
+                for statement, values in totals_statements.get(target, {}).items()
+            }
+        return {
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'duration_s': round(time.perf_counter() - self.started, 3),
+            'chunk_size': self.chunk_size,
+            'parsing': time_summary(totals_parsing),
+            'targets': targets,
+            'files': files,
+            'errors': self.errors
+        }
+
+    def write_report(self, report_path=None):
+        if report_path is None:
+            report_path = os.path.join(REPORT_DIR, f"caricamento_{self.started_at:%Y%m%d_%H%M%S}.json")
+        directory = os.path.dirname(report_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(report_path, 'w', encoding='utf-8') as file:
+            json.dump(self.summary(), file, indent=2, ensure_ascii=False)
+        return report_path
@@ -0,0 +1,109 @@
+import argparse
+import psycopg2
+from neo4j import GraphDatabase
+
+# Porta ai tipi usati dai caricatori (incidenti_csv.FIELD_TYPES) i database caricati quando ogni valore
+# era una stringa, senza doverli ricaricare. Le istruzioni si possono rieseguire: i valori già convertiti
+# restano invariati.
+
+uri = "bolt://localhost:7687"
+versions = ['version1', 'version2', 'version3', 'version4']
+
+POSTGRES_MIGRATIONS = [
+    """
+    ALTER TABLE incidente
+        ALTER COLUMN longitudine TYPE DOUBLE PRECISION USING NULLIF(longitudine::TEXT, '')::DOUBLE PRECISION,
+        ALTER COLUMN latitudine TYPE DOUBLE PRECISION USING NULLIF(latitudine::TEXT, '')::DOUBLE PRECISION;
+    """,
+    """
+    ALTER TABLE persona ALTER COLUMN idpersona TYPE BIGINT;
+    """,
+    """
+    ALTER TABLE persona
+        ALTER COLUMN deceduto TYPE BOOLEAN USING CASE
+            WHEN deceduto::TEXT IN ('-1', '1', 'true') THEN TRUE
+            WHEN deceduto::TEXT IN ('0', 'false') THEN FALSE
+        END;
+    """
+]
+
+# Data del CSV (gg/mm/aaaa hh:mm[:ss]) -> localdatetime
+DATA_INCIDENTE = """
+    localdatetime({
+        year: toInteger(substring(n.dataincidente, 6, 4)),
+        month: toInteger(substring(n.dataincidente, 3, 2)),
+        day: toInteger(substring(n.dataincidente, 0, 2)),
+        hour: CASE WHEN size(n.dataincidente) >= 16 THEN toInteger(substring(n.dataincidente, 11, 2)) ELSE 0 END,
+        minute: CASE WHEN size(n.dataincidente) >= 16 THEN toInteger(substring(n.dataincidente, 14, 2)) ELSE 0 END,
+        second: CASE WHEN size(n.dataincidente) >= 19 THEN toInteger(substring(n.dataincidente, 17, 2)) ELSE 0 END
+    })
+"""
+
+NEO4J_MIGRATIONS = [
+    ("Incidente", "", """
+        n.protocollo = toInteger(n.protocollo), n.gruppo = toInteger(n.gruppo),
+        n.numero_feriti = toInteger(n.numero_feriti), n.numero_illesi = toInteger(n.numero_illesi),
+        n.numero_morti = toInteger(n.numero_morti),
+        n.longitudine = toFloat(n.longitudine), n.latitudine = toFloat(n.latitudine)
+    """),
+    ("Incidente", "WHERE n.dataincidente CONTAINS '/'", f"n.dataincidente = {DATA_INCIDENTE}"),
+    ("Strada", "", "n.protocollo = toInteger(n.protocollo)"),
+    ("Veicolo", "", "n.protocollo = toInteger(n.protocollo), n.progressivo = toInteger(n.progressivo)"),
+    ("Persona", "", """
+        n.protocollo = toInteger(n.protocollo),
+        n.deceduto = CASE n.deceduto WHEN '-1' THEN true WHEN '0' THEN false ELSE n.deceduto END
+    """),
+    ("Gruppo", "", "n.nome = toInteger(n.nome)"),
+    ("Caricamento", "", "n.protocolli = [protocollo IN n.protocolli | toInteger(protocollo)]"),
+]
+
+def migrate_postgres():
+    try:
+        conn = psycopg2.connect(
+            dbname="incidenti",
+            user="postgres",
+            password="admin",
+            host="localhost",
+            port="5432"
+        )
+    except Exception as e:
+        print(f"Errore nella connessione al database incidenti: {e}")
+        return
+    try:
+        cur = conn.cursor()
+        for migration in POSTGRES_MIGRATIONS:
+            cur.execute(migration)
+        cur.execute("ANALYZE incidente, persona;")
+        conn.commit()
+        cur.close()
+        print("Tipi delle colonne PostgreSQL aggiornati.")
+    except Exception as e:
+        print(f"Errore nella migrazione PostgreSQL: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+def migrate_neo4j(driver, db_name):
+    with driver.session(database=db_name) as session:
+        for label, where, assignments in NEO4J_MIGRATIONS:
+            # CALL {...} IN TRANSACTIONS richiede una transazione implicita (session.run)
+            summary = session.run(
+                f"MATCH (n:{label}) {where} "
+                f"CALL {{ WITH n SET {assignments} }} IN TRANSACTIONS OF 10000 ROWS"
+            ).consume()
+            print(f"{db_name}: {label} -> {summary.counters.properties_set} properties converted")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--postgres', action='store_true', help="Migra solo PostgreSQL")
+    parser.add_argument('--neo4j', action='store_true', help="Migra solo i database Neo4j")
+    args = parser.parse_args()
+    tutti = not args.postgres and not args.neo4j
+
+    if args.postgres or tutti:
+        migrate_postgres()
+    if args.neo4j or tutti:
+        driver = GraphDatabase.driver(uri, auth=("neo4j", "adminadmin"))
+        for db_name in versions:
+            migrate_neo4j(driver, db_name)
+        driver.close()
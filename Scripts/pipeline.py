@@ -0,0 +1,106 @@
+import os
+import time
+from tqdm import tqdm
+from incidenti_cache import iter_incident_chunks, source_checksum
+from incidenti_csv import CHUNK_SIZE, READ_ERRORS
+from load_metrics import LoadMetrics
+
+# Un sink è un oggetto con i metodi open(), wants_file(csv_file, checksum), start_file(csv_file, checksum),
+# load_chunk(records), end_file(csv_file) e close(): ogni CSV viene letto e normalizzato una sola volta,
+# a blocchi di dimensione fissa, e ogni blocco viene passato a tutti i sink che lo richiedono prima di
+# leggere il successivo. wants_file permette a un sink in modalità delta di saltare i file già caricati.
+# I blocchi arrivano dalla cache colonnare (incidenti_cache), che rilegge il CSV solo quando cambia.
+# Prima di open() la pipeline assegna a ogni sink lo stesso LoadMetrics (sink.metrics), in cui il sink
+# registra le latenze delle proprie statement con il nome sink.target.
+# Un'eccezione in un sink lo segna come fallito (sink.failed, come fa PostgresSink per i propri errori):
+# viene escluso dal resto del caricamento e chiuso alla fine, mentre gli altri sink proseguono.
+# Un errore di lettura del CSV interrompe solo quel file: end_file non viene chiamato, così nessun sink lo
+# registra come caricato e la modalità delta lo riprende (dall'ultimo blocco confermato) alla prossima
+# esecuzione. Un sink che riceve start_file senza l'end_file del file precedente deve scartarne lo stato.
+
+def timed_chunks(csv_file, chunk_size, metrics):
+    # Tempo di lettura e normalizzazione, separato da quello passato nei sink
+    chunks = iter_incident_chunks(csv_file, chunk_size)
+    while True:
+        wall, cpu = time.perf_counter(), time.process_time()
+        records = next(chunks, None)
+        if records is None:
+            return
+        metrics.add_parse(len(records), time.perf_counter() - wall, time.process_time() - cpu)
+        yield records
+
+def timed_call(metrics, sink, method, *args, rows=0):
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        return getattr(sink, method)(*args)
+    finally:
+        metrics.add_load(sink.target, rows, time.perf_counter() - wall, time.process_time() - cpu)
+
+def failed(sink):
+    return getattr(sink, 'failed', False)
+
+def mark_failed(metrics, sink, method, error):
+    print(f"Errore in {sink.target} ({method}): {error}. Il sink viene escluso dal caricamento.")
+    metrics.add_error(sink.target, method, str(error))
+    sink.failed = True
+
+def guarded_call(metrics, sink, method, *args, rows=0):
+    try:
+        timed_call(metrics, sink, method, *args, rows=rows)
+    except Exception as e:
+        mark_failed(metrics, sink, method, e)
+
+def wants_file(metrics, sink, csv_file, checksum):
+    if failed(sink):
+        return False
+    try:
+        return sink.wants_file(csv_file, checksum)
+    except Exception as e:
+        mark_failed(metrics, sink, 'wants_file', e)
+        return False
+
+def run_pipeline(csv_files, sinks, chunk_size=CHUNK_SIZE, report_path=None):
+    metrics = LoadMetrics(chunk_size)
+    for sink in sinks:
+        sink.metrics = metrics
+    try:
+        for sink in sinks:
+            guarded_call(metrics, sink, 'open')
+        for csv_file in csv_files:
+            if all(failed(sink) for sink in sinks):
+                print("Tutti i sink sono falliti: caricamento interrotto.")
+                break
+            csv_file = os.path.normpath(csv_file)
+            checksum = source_checksum(csv_file)
+            active_sinks = [sink for sink in sinks if wants_file(metrics, sink, csv_file, checksum)]
+            if not active_sinks:
+                print(f"{csv_file} invariato, nessun caricamento necessario.")
+                continue
+
+            metrics.start_file(csv_file)
+            for sink in active_sinks:
+                guarded_call(metrics, sink, 'start_file', csv_file, checksum)
+            try:
+                with tqdm(desc=f"Lettura {csv_file}", unit="riga") as progress:
+                    for records in timed_chunks(csv_file, chunk_size, metrics):
+                        active_sinks = [sink for sink in active_sinks if not failed(sink)]
+                        if not active_sinks:
+                            break
+                        for sink in active_sinks:
+                            guarded_call(metrics, sink, 'load_chunk', records, rows=len(records))
+                        progress.update(len(records))
+            except READ_ERRORS as e:
+                print(f"Errore nella lettura di {csv_file}: {e}. Il file non viene registrato come caricato.")
+                metrics.add_error(None, 'read', str(e))
+                metrics.end_file()
+                continue
+            for sink in active_sinks:
+                if not failed(sink):
+                    guarded_call(metrics, sink, 'end_file', csv_file)
+            metrics.end_file()
+    finally:
+        metrics.end_file()
+        # Anche i sink falliti vengono chiusi, per rilasciare connessioni e sessioni
+        for sink in sinks:
+            guarded_call(metrics, sink, 'close')
+        print(f"Report del caricamento: {metrics.write_report(report_path)}")
@@ -0,0 +1,329 @@
+# Query usate per il confronto tra PostgreSQL e Neo4j (lette da benchmark.py, Query_with_connection.py e dal
+# caricatore PostgreSQL per il report sugli indici). Ogni query ha un id logico, il testo SQL e una variante
+# Cypher per ogni versione del grafo (neo4j_versions.py), scritta sul modello di quella versione; 'params'
+# contiene i parametri facoltativi, passati come %(nome)s a PostgreSQL e come $nome a Neo4j. 'fields' sono i
+# campi che identificano una riga del risultato in ogni motore, usati per l'impronta del risultato
+# (result_fingerprint.py) con cui il benchmark verifica che i motori restituiscano le stesse righe.
+
+GRAPH_VERSIONS = ['version1', 'version2', 'version3', 'version4']
+
+# Nome della strada: strada1 in PostgreSQL, proprietà nome del nodo Strada
+STRADA = ('strada1', 'nome')
+
+def cypher(text, versions=GRAPH_VERSIONS):
+    return dict.fromkeys(versions, text)
+
+QUERIES = [
+    {
+        'id': 'Q1',
+        'name': 'Query 1 (Informazioni di tuti gli incidenti)',
+        'fields': ['protocollo'],
+        'sql': """
+    SELECT *
+    FROM Incidente
+    """,
+        'cypher': cypher("""
+    MATCH(i:Incidente)
+    RETURN i
+    """)
+    },
+    {
+        'id': 'Q2',
+        'name': 'Query 2 (Visualizza gli incidenti ed i veicoli coinvolti)',
+        'fields': ['protocollo'],
+        'sql': """
+    SELECT i.protocollo
+    FROM Incidente i
+    JOIN veicolo v ON i.protocollo = v.protocollo
+    """,
+        'cypher': cypher("""
+    MATCH(i:Incidente)-[:COINVOLGE_VEICOLO]->(v:Veicolo)
+    RETURN i,v
+    """)
+    },
+    {
+        'id': 'Q3',
+        'name': 'Query 3 (Conteggio numero incidenti per dato gruppo)',
+        'fields': ['gruppo', 'numero_incidenti'],
+        'sql': """
+    SELECT gruppo, COUNT(*) AS numero_incidenti
+    FROM incidente
+    GROUP BY gruppo
+    ORDER BY gruppo;
+    """,
+        'cypher': {
+            # Nelle versioni 1 e 2 il gruppo è una proprietà di Incidente
+            **cypher("""
+    MATCH (i:Incidente)
+    WITH i.gruppo AS gruppo, COUNT(i) AS numero_incidenti
+    RETURN gruppo, numero_incidenti
+    ORDER BY gruppo;
+    """, ['version1', 'version2']),
+            # Dalla versione 3 è un nodo collegato con INTERVENUTO
+            **cypher("""
+    MATCH (i:Incidente)<-[:INTERVENUTO]-(g:Gruppo)
+    WITH g, COUNT(i) AS numero_incidenti
+    RETURN g.nome AS gruppo, numero_incidenti
+    ORDER BY g.nome;
+    """, ['version3', 'version4'])
+        }
+    },
+    {
+        'id': 'Q4',
+        'name': 'Query 4 (Visualizzo infomazioni su incidenti occorsi su strada che coinvolgo un tipo specifico di veicolo)',
+        'fields': ['protocollo', 'progressivo', STRADA],
+        'sql': """
+    SELECT v.*, i.*, s.*
+    FROM Veicolo v
+    JOIN Incidente i ON i.protocollo = v.protocollo
+    JOIN Strada s ON s.protocollo = i.protocollo
+    WHERE v.tipo_veicolo = 'Velocipede';
+    """,
+        'cypher': {
+            **cypher("""
+    MATCH (v:Veicolo {tipoveicolo: "Velocipede"})<-[:COINVOLGE_VEICOLO]-(i:Incidente)-[:OCCORSO_SU]->(s:Strada)
+    RETURN v, i, s
+    """, ['version1']),
+            **cypher("""
+    MATCH (tv:TipoVeicolo {nome: "Velocipede"})<-[:TIPO]-(v:Veicolo)<-[:COINVOLGE_VEICOLO]-(i:Incidente)-[:OCCORSO_SU]->(s:Strada)
+    RETURN v, i, s
+    """, ['version2', 'version3']),
+            # La versione 4 ha anche le relazioni inverse
+            **cypher("""
+    MATCH (tv:TipoVeicolo {nome: "Velocipede"})-[:TIPO]->(v:Veicolo)-[:VEICOLO_COINVOLTO_IN]->(i:Incidente)-[:OCCORSO_SU]->(s:Strada)
+    RETURN v, i, s
+    """, ['version4'])
+        }
+    },
+    {
+        'id': 'Q5',
+        'name': 'Query 5 (Identificare tutti gli incidenti che coinvolgono un autovettura privata e di trovare tutte le persone coinvolte in incidenti correlati fino a una profondità di 3.)',
+        'fields': ['protocollo', 'idpersona'],
+        'sql': """
+    SELECT i.protocollo, p1.idpersona, v.tipo_veicolo
+    FROM incidente AS i
+    JOIN veicolo AS v ON i.protocollo = v.protocollo
+    JOIN persona AS p1 ON i.protocollo = p1.protocollo
+    WHERE v.tipo_veicolo = 'Autovettura privata'
+
+    UNION
+
+    SELECT i.protocollo, p2.idpersona, v.tipo_veicolo
+    FROM incidente AS i
+    JOIN veicolo AS v ON i.protocollo = v.protocollo
+    JOIN persona AS p1 ON i.protocollo = p1.protocollo
+    JOIN persona AS p2 ON p1.protocollo = p2.protocollo AND p1.idpersona <> p2.idpersona
+    WHERE v.tipo_veicolo = 'Autovettura privata'
+
+    UNION
+
+    SELECT i.protocollo, p3.idpersona, v.tipo_veicolo
+    FROM incidente AS i
+    JOIN veicolo AS v ON i.protocollo = v.protocollo
+    JOIN persona AS p1 ON i.protocollo = p1.protocollo
+    JOIN persona AS p2 ON p1.protocollo = p2.protocollo AND p1.idpersona <> p2.idpersona
+    JOIN persona AS p3 ON p2.protocollo = p3.protocollo AND p2.idpersona <> p3.idpersona
+    WHERE v.tipo_veicolo = 'Autovettura privata'
+
+    ORDER BY protocollo;
+    """,
+        'cypher': {
+            **cypher("""
+    MATCH (i:Incidente)-[:COINVOLGE_VEICOLO]->(v:Veicolo)
+    WHERE v.tipoveicolo = "Autovettura privata"
+    MATCH (i)-[:COINVOLGE_PERSONA*1..3]->(p:Persona)
+    RETURN DISTINCT i.protocollo, p.idpersona, v.tipoveicolo AS tipoVeicolo
+    ORDER BY i.protocollo
+    """, ['version1']),
+            **cypher("""
+    MATCH (i:Incidente)-[:COINVOLGE_VEICOLO]->(v:Veicolo)-[:TIPO]->(t:TipoVeicolo {nome: "Autovettura privata"}),
+      (i)-[:COINVOLGE_PERSONA*1..3]->(p:Persona)
+    RETURN DISTINCT i.protocollo, p.idpersona, t.nome
+    ORDER BY i.protocollo
+    """, ['version2', 'version3', 'version4'])
+        }
+    },
+    {
+        'id': 'Q6',
+        'name': 'Query 6 (Informazioni dettagliate su incidenti stradali specifici)',
+        'fields': ['protocollo', 'idpersona', 'nome_strada'],
+        'sql': """
+    SELECT i.protocollo, p1.idpersona, v.tipo_veicolo, s.strada1 AS nome_strada
+    FROM incidente AS i
+    JOIN veicolo AS v ON i.protocollo = v.protocollo
+    JOIN persona AS p1 ON i.protocollo = p1.protocollo
+    JOIN strada AS s ON i.protocollo = s.protocollo
+    WHERE v.tipo_veicolo = 'Autovettura privata'
+
+    UNION
+
+    SELECT i.protocollo, p2.idpersona, v.tipo_veicolo, s.strada1 AS nome_strada
+    FROM incidente AS i
+    JOIN veicolo AS v ON i.protocollo = v.protocollo
+    JOIN persona AS p1 ON i.protocollo = p1.protocollo
+    JOIN persona AS p2 ON p1.protocollo = p2.protocollo AND p1.idpersona <> p2.idpersona
+    JOIN strada AS s ON i.protocollo = s.protocollo
+    WHERE v.tipo_veicolo = 'Autovettura privata'
+
+    UNION
+
+    SELECT i.protocollo, p3.idpersona, v.tipo_veicolo, s.strada1 AS nome_strada
+    FROM incidente AS i
+    JOIN veicolo AS v ON i.protocollo = v.protocollo
+    JOIN persona AS p1 ON i.protocollo = p1.protocollo
+    JOIN persona AS p2 ON p1.protocollo = p2.protocollo AND p1.idpersona <> p2.idpersona
+    JOIN persona AS p3 ON p2.protocollo = p3.protocollo AND p2.idpersona <> p3.idpersona
+    JOIN strada AS s ON i.protocollo = s.protocollo
+    WHERE v.tipo_veicolo = 'Autovettura privata'
+
+    ORDER BY protocollo;
+    """,
+        'cypher': {
+            **cypher("""
+    MATCH (i:Incidente)-[:COINVOLGE_VEICOLO]->(v:Veicolo)
+    WHERE v.tipoveicolo = "Autovettura privata"
+    MATCH (i)-[:COINVOLGE_PERSONA*1..3]->(p:Persona)
+    MATCH (i)-[:OCCORSO_SU]->(s:Strada)  // Aggiunta del join per la strada
+    RETURN i.protocollo,
+       p.idpersona,
+       v.tipoveicolo AS tipoVeicolo,
+       s.nome AS nomeStrada  // Restituzione del nome della strada
+    ORDER BY i.protocollo;
+    """, ['version1']),
+            **cypher("""
+    MATCH (i:Incidente)-[:COINVOLGE_VEICOLO]->(v:Veicolo)-[:TIPO]->(t:TipoVeicolo {nome: "Autovettura privata"}),
+      (i)-[:COINVOLGE_PERSONA*1..3]->(p:Persona),
+      (i)-[:OCCORSO_SU]->(s:Strada)  // Aggiunta del join per la strada
+    RETURN i.protocollo,
+       p.idpersona,
+       t.nome AS tipo_veicolo,
+       s.nome AS nome_strada
+    ORDER BY i.protocollo;
+    """, ['version2', 'version3', 'version4'])
+        }
+    },
+    {
+        'id': 'Q7',
+        'name': 'Query 7 (Cerca incidenti specifici in cui sono coinvolti uomini con lesione tipolesione = Prognosi riservata e ci sono almeno due veicoli diversi coinvolti nello stesso incidente in cui la strada ha un fondo Asciutto)',
+        'fields': ['protocollo', 'idpersona', 'tipolesione', 'tipoveicolo_v1', 'tipoveicolo_v2'],
+        'sql': """
+    SELECT
+    i.protocollo,
+    p.idpersona,
+    p.tipolesione,
+    v1.tipo_veicolo AS tipoVeicolo_v1,
+    v2.tipo_veicolo AS tipoVeicolo_v2
+    FROM
+    incidente AS i
+    JOIN
+    persona AS p ON i.protocollo = p.protocollo AND p.sesso = 'M' AND p.tipolesione = 'Prognosi riservata'
+    JOIN
+    veicolo AS v1 ON i.protocollo = v1.protocollo
+    JOIN
+    veicolo AS v2 ON i.protocollo = v2.protocollo
+    JOIN
+    strada AS s ON v1.protocollo = s.protocollo AND s.fondostradale = 'Asciutto'
+    WHERE
+    v1.tipo_veicolo <> v2.tipo_veicolo
+    ORDER BY i.protocollo;
+    """,
+        'cypher': {
+            **cypher("""
+    MATCH (i:Incidente)-[:COINVOLGE_PERSONA]->(p:Persona {sesso: 'M', tipolesione: 'Prognosi riservata'}),
+    (i)-[:COINVOLGE_VEICOLO]->(v1:Veicolo)-[:SU]->(s:Strada {fondostradale: 'Asciutto'}),
+    (i)-[:COINVOLGE_VEICOLO]->(v2:Veicolo)-[:SU]->(s)
+    WHERE v1.tipoveicolo <> v2.tipoveicolo
+    RETURN i.protocollo, p.idpersona, p.tipolesione, v1.tipoveicolo AS tipoVeicolo_v1, v2.tipoveicolo AS tipoVeicolo_v2
+    """, ['version1']),
+            **cypher("""
+    MATCH (i:Incidente)-[:COINVOLGE_PERSONA]->(p:Persona {sesso: 'M', tipolesione: 'Prognosi riservata'}),
+      (i)-[:COINVOLGE_VEICOLO]->(v1:Veicolo)-[:TIPO]->(t1:TipoVeicolo), // Collega v1 a TipoVeicolo
+      (i)-[:COINVOLGE_VEICOLO]->(v2:Veicolo)-[:TIPO]->(t2:TipoVeicolo), // Collega v2 a TipoVeicolo
+      (v1)-[:SU]->(s:Strada {fondostradale: 'Asciutto'}),
+      (v2)-[:SU]->(s)
+    WHERE t1.nome <> t2.nome  // Assicurati che i tipi di veicolo siano diversi
+    RETURN i.protocollo, p.idpersona, p.tipolesione, t1.nome AS tipoVeicolo_v1, t2.nome AS tipoVeicolo_v2
+    """, ['version2', 'version3', 'version4'])
+        }
+    },
+    {
+        'id': 'Q8',
+        'name': 'Query 8 (Informazioni incidenti partendo da un nodo specifico)',
+        'fields': ['protocollo', 'progressivo', STRADA],
+        'sql': """
+    SELECT i.*, v.*, s.*
+    FROM incidente AS i
+    JOIN veicolo AS v ON i.protocollo = v.protocollo
+    JOIN strada AS s ON v.protocollo = s.protocollo
+    WHERE i.protocollo = %(protocollo)s;
+    """,
+        ### Molto piu efficiente su neo4j, ciò è dovuto al fatto che parte da un nodo specifico
+        'cypher': cypher("""
+    MATCH (i:Incidente {protocollo: $protocollo})-[:COINVOLGE_VEICOLO]->(v:Veicolo)-[:SU]->(s:Strada)
+    RETURN i,v,s
+    """),
+        'params': {'protocollo': 4733221}
+    },
+    {
+        'id': 'Q9',
+        'name': 'Query 9 (Informazioni incidenti partendo da nodo generico)',
+        'fields': ['protocollo', 'progressivo', STRADA],
+        'sql': """
+    SELECT i.*, v.*, s.*
+    FROM incidente AS i
+    JOIN veicolo AS v ON i.protocollo = v.protocollo
+    JOIN strada AS s ON v.protocollo = s.protocollo;
+    """,
+        ### Meno efficiente du neo4j, ciò è dovuto dal fatto che non parte da un nodo specifico
+        'cypher': cypher("""
+    MATCH (i:Incidente)-[:COINVOLGE_VEICOLO]->(v:Veicolo),(v)-[:SU]->(s:Strada)
+        RETURN i, v, s;
+    """)
+    },
+    {
+        'id': 'Q10',
+        'name': 'Query 10 (Informazioni su incidenti dove è intervenuto il gruppo 26)',
+        'fields': ['protocollo', 'progressivo', STRADA],
+        'sql': """
+    SELECT i.*, s.*, v.*
+    FROM incidente AS i
+    JOIN strada AS s ON i.protocollo = s.protocollo
+    JOIN veicolo AS v ON i.protocollo = v.protocollo
+    WHERE i.gruppo = %(gruppo)s;
+    """,
+        'cypher': {
+            # Versioni 1 e 2: il gruppo è un attributo di incidente. Prestazioni superiori rispetto a sql ma
+            # peggiori rispetto alla query dove posso sfruttare gruppo come nodo e navigare le relazioni.
+            **cypher("""
+    MATCH (i:Incidente {gruppo: $gruppo})-[:OCCORSO_SU]->(s:Strada),
+        (i)-[:COINVOLGE_VEICOLO]->(v:Veicolo)
+        RETURN i, s, v;
+    """, ['version1', 'version2']),
+            # Versioni 3 e 4: parto dal nodo Gruppo e poi navigo le relazioni tra nodi
+            **cypher("""
+    MATCH (g:Gruppo {nome: $gruppo})-[:INTERVENUTO]->(i:Incidente)-[:OCCORSO_SU]->(s:Strada),
+        (i)-[:COINVOLGE_VEICOLO]->(v:Veicolo)
+        RETURN i, s, v;
+    """, ['version3', 'version4'])
+        },
+        'params': {'gruppo': 26}
+    }
+]
+
+QUERIES_BY_ID = {}
+for query in QUERIES:
+    if query['id'] in QUERIES_BY_ID:
+        raise ValueError(f"Query {query['id']} duplicata nel catalogo")
+    missing = [version for version in GRAPH_VERSIONS if version not in query['cypher']]
+    if missing:
+        raise ValueError(f"Query {query['id']}: manca la variante Cypher per {', '.join(missing)}")
+    query.setdefault('params', {})
+    QUERIES_BY_ID[query['id']] = query
+
+def sql_query(query_id):
+    query = QUERIES_BY_ID[query_id]
+    return query['sql'], query['params']
+
+def cypher_query(query_id, version):
+    query = QUERIES_BY_ID[query_id]
+    return query['cypher'][version], query['params']
@@ -0,0 +1,68 @@
+import hashlib
+import re
+from datetime import date, datetime, time
+from decimal import Decimal
+
+# Impronta di un risultato, calcolata riga per riga mentre il risultato viene letto (niente viene tenuto in
+# memoria): numero di righe più la somma modulo 2^64 di un hash per riga, quindi indipendente dall'ordine
+# delle righe ma non dai duplicati. Ogni riga viene ridotta ai campi della query (query_catalog.py, 'fields'):
+# i nomi delle colonne perdono alias di tabella, maiuscole e '_' (v.tipo_veicolo e v.tipoVeicolo diventano
+# tipoveicolo) e i nodi Neo4j restituiti interi contribuiscono con le proprie proprietà, come le colonne di
+# SELECT i.*. Un campo può avere più nomi alternativi, ad esempio ('strada1', 'nome') per il nome della
+# strada. Due motori con la stessa impronta hanno restituito le stesse righe.
+
+MASK = (1 << 64) - 1
+
+def normalize_name(name):
+    return re.sub(r'[^a-z0-9]', '', name.split('.')[-1].lower())
+
+def normalize_value(value):
+    if value is None or isinstance(value, (bool, int)):
+        return value
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, (float, Decimal)):
+        # Stessa precisione per double PostgreSQL, numeric e float Neo4j
+        value = float(f"{float(value):.12g}")
+        return int(value) if value.is_integer() else value
+    if hasattr(value, 'to_native'):
+        # Tipi temporali del driver Neo4j
+        value = value.to_native()
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize_value(item) for item in value)
+    return str(value)
+
+def flatten(names, values):
+    row = {}
+    for name, value in zip(names, values):
+        if hasattr(value, 'labels') or isinstance(value, dict):
+            # Nodo (o mappa) restituito intero: vale come l'elenco delle sue proprietà
+            row.update((normalize_name(key), item) for key, item in value.items())
+        else:
+            row[normalize_name(name)] = value
+    return row
+
+def normalize_fields(fields):
+    return [tuple(normalize_name(name) for name in ((field,) if isinstance(field, str) else field)) for field in fields]
+
+class ResultFingerprint:
+    def __init__(self, fields=None):
+        self.fields = normalize_fields(fields) if fields else None
+        self.rows = 0
+        self.digest = 0
+
+    def project(self, row):
+        if self.fields is None:
+            return tuple(sorted(row.items()))
+        return tuple(next((row[name] for name in names if name in row), None) for names in self.fields)
+
+    def add(self, names, values):
+        row = {name: normalize_value(value) for name, value in flatten(names, values).items()}
+        hashed = hashlib.blake2b(repr(self.project(row)).encode('utf-8'), digest_size=8).digest()
+        self.digest = (self.digest + int.from_bytes(hashed, 'big')) & MASK
+        self.rows += 1
+
+    def summary(self):
+        return {'rows': self.rows, 'fingerprint': f"{self.rows}:{self.digest:016x}"}
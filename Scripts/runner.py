@@ -1,6 +1,10 @@
-import subprocess
+import importlib.util
+import os
+import sys
 import inquirer
 from neo4j import GraphDatabase
+from incidenti_csv import get_csv_files
+from pipeline import run_pipeline
 
 uri = "bolt://localhost:7687"
 driver = GraphDatabase.driver(uri, auth=("neo4j", "adminadmin"))
@@ -13,9 +17,22 @@ script_to_db = {
     'Scripts/Scripts_Neo4j/csv-to-neo4j-incidenti_v4.py': 'version4'
 }
 
-def run_script(script):
-    print(f"Esecuzione dello script: {script}")
-    subprocess.run(['python', script])
+def load_script(script):
+    # I loader Neo4j importano i moduli della propria cartella (neo4j_batch, neo4j_schema)
+    script_dir = os.path.dirname(os.path.abspath(script))
+    if script_dir not in sys.path:
+        sys.path.insert(0, script_dir)
+    module_name = os.path.splitext(script)[0].replace('/', '_').replace('-', '_')
+    spec = importlib.util.spec_from_file_location(module_name, script)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def run_scripts(scripts, delta=False):
+    # Ogni CSV viene letto una sola volta e inviato a tutti i loader selezionati
+    print(f"Esecuzione degli script: {', '.join(scripts)}")
+    sinks = [load_script(script).create_sink(delta=delta) for script in scripts]
+    run_pipeline(get_csv_files('./Datasets'), sinks)
 
 def clear_and_create_database(db_name):
     if db_name:
@@ -39,6 +56,10 @@ if __name__ == "__main__":
                           message="Seleziona gli script da eseguire",
                           choices=scripts,
                           ),
+        inquirer.List('modalita',
+                      message="Modalità di caricamento",
+                      choices=['completo', 'delta'],
+                      ),
     ]
 
     while True:
@@ -48,17 +69,20 @@ if __name__ == "__main__":
             print("Nessuno script selezionato.")
             continue
 
-        for script in answers['selected_scripts']:
-            db_name = script_to_db.get(script)
-            clear_and_create_database(db_name)
-
         if 'Esegui tutti gli script' in answers['selected_scripts']:
             print("Esecuzione di tutti gli script...")
-            for script in scripts[:-1]:
-                run_script(script)
+            selected_scripts = scripts[:-1]
         else:
-            for script in answers['selected_scripts']:
-                run_script(script)
+            selected_scripts = answers['selected_scripts']
+
+        # In modalità delta i database non vengono ricreati: si caricano solo i file nuovi o modificati
+        delta = answers['modalita'] == 'delta'
+        if not delta:
+            for script in selected_scripts:
+                db_name = script_to_db.get(script)
+                clear_and_create_database(db_name)
+
+        run_scripts(selected_scripts, delta)
 
         run_more = inquirer.confirm("Vuoi eseguire altri script?", default=True)
         if not run_more:
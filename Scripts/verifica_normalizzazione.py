@@ -0,0 +1,138 @@
+import argparse
+import csv
+import os
+import tempfile
+from incidenti_csv import (
+    CONVERTERS, FIELDS, PERSONE_PER_INCIDENTE, PROTOCOLLI_PER_MESE, READ_ERRORS, IncidentRecord, clean_key, convert_value,
+    detect_encoding, get_csv_files, month_code, parse_dates, persona_id, read_incident_columns, records_from_columns,
+    repair_mojibake, to_datetime
+)
+
+# Controllo di regressione della normalizzazione a colonne di incidenti_csv (normalize_columns, parse_dates,
+# persona_ids): ogni CSV viene riletto riga per riga con i convertitori di riferimento (convert_value,
+# to_datetime, persona_id) e i record devono coincidere, valore e tipo, con quelli di read_incident_columns.
+# Oltre ai file del dataset viene controllato un CSV di esempio con i casi limite (date non valide, righe
+# corte, protocolli non numerici, incidenti divisi tra blocchi) e due file con id delle persone non più
+# univoci (un incidente con troppe righe, un protocollo troppo lungo), che devono diventare errori di lettura.
+# I file di esempio seguono la struttura del dataset (<anno>/csv_incidenti<Mese>.csv), da cui viene il mese
+# dell'id.
+
+DATE_SAMPLES = [
+    '01/01/2020 00:00:00', '31/12/2021 23:59:59', '29/02/2020 12:30', '29/02/2021 12:30', '31/04/2020',
+    '00/01/2020', '15/13/2020 10:00', '15/06/2020 24:00', '15/06/2020 10:60:00', '15/06/0000 10:00',
+    '1/6/2020 10:00', '15-06-2020 10:00', '15/06/2020T10:00', '15/06/2020 1a:00', '2020-06-15', 'n.d.'
+]
+
+MONTHS = {1: 'Gennaio', 2: 'Febbraio', 3: 'Marzo'}
+
+def read_rows(file_path, encoding):
+    # Riferimento: una riga alla volta, senza numpy
+    with open(file_path, mode='r', encoding=encoding, newline='') as incidents_file:
+        reader = csv.reader((repair_mojibake(line) for line in incidents_file), delimiter=';')
+        header = [clean_key(key) for key in next(reader)]
+        positions = [header.index(field) if field in header else None for field in FIELDS]
+        ordinali = {}
+        mese = month_code(file_path)
+        for row in reader:
+            values = [
+                convert_value(convert, row[position] if position is not None and position < len(row) else '')
+                for convert, position in zip(CONVERTERS, positions)
+            ]
+            protocollo = row[positions[0]].strip() if positions[0] is not None else ''
+            ordinali[protocollo] = ordinali.get(protocollo, 0) + 1
+            yield IncidentRecord(*values, persona_id(mese, protocollo, ordinali[protocollo]))
+
+def read_columns(file_path, encoding, chunk_size):
+    for columns in read_incident_columns(file_path, encoding, chunk_size):
+        yield from records_from_columns(columns)
+
+def compare(file_path, chunk_size, encoding=None):
+    # I file di esempio hanno una codifica nota: detect_encoding li aggiungerebbe alla cache delle codifiche
+    if encoding is None:
+        encoding = detect_encoding(file_path)
+    expected = list(read_rows(file_path, encoding))
+    actual = list(read_columns(file_path, encoding, chunk_size))
+    if len(expected) != len(actual):
+        return f"{len(actual)} righe invece di {len(expected)}"
+    for number, (row, record) in enumerate(zip(expected, actual), start=1):
+        for field, value, other in zip(IncidentRecord._fields, row, record):
+            if value != other or type(value) is not type(other):
+                return f"riga {number}, {field}: {other!r} invece di {value!r}"
+    return None
+
+SAMPLE_ENCODING = 'utf-8'
+
+def write_sample(file_path, rows):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, 'w', encoding=SAMPLE_ENCODING, newline='') as sample_file:
+        csv.writer(sample_file, delimiter=';').writerows([FIELDS] + rows)
+
+def sample_rows():
+    rows = []
+    for number, date in enumerate(DATE_SAMPLES + ['', ' 02/03/2020 08:15 ']):
+        row = [''] * len(FIELDS)
+        row[FIELDS.index('protocollo')] = str(4700000 + number % 5)
+        row[FIELDS.index('dataoraincidente')] = date
+        row[FIELDS.index('num_feriti')] = str(number % 3) if number % 4 else ''
+        row[FIELDS.index('longitude')] = f"12.{number}" if number % 3 else 'x'
+        row[FIELDS.index('deceduto')] = ['-1', '0', '1', ''][number % 4]
+        rows.append(row)
+    # Protocollo non numerico o mancante e righe più corte dell'intestazione
+    rows.append(['AB12', '1', '01/01/2020'])
+    rows.append(['', '2'])
+    return rows
+
+def check_dates():
+    dates = parse_dates(DATE_SAMPLES)
+    return [value for value in DATE_SAMPLES if dates[value] != to_datetime(value)]
+
+def check_overflow(directory):
+    # Restituisce i casi che non vengono segnalati come errore di lettura
+    cases = {
+        f"un incidente con {PERSONE_PER_INCIDENTE} righe": [['4700000'] for _ in range(PERSONE_PER_INCIDENTE)],
+        f"il protocollo {PROTOCOLLI_PER_MESE}": [['4700000'], [str(PROTOCOLLI_PER_MESE)]],
+    }
+    missed = []
+    for month, (name, rows) in enumerate(cases.items(), start=2):
+        file_path = os.path.join(directory, '2020', f"csv_incidenti{MONTHS[month]}.csv")
+        write_sample(file_path, rows)
+        try:
+            list(read_columns(file_path, SAMPLE_ENCODING, 7))
+            missed.append(name)
+        except READ_ERRORS:
+            pass
+    return missed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('files', nargs='*', help="CSV da controllare (default: tutti quelli di --dataset)")
+    parser.add_argument('--dataset', default='./Datasets', help="Cartella del dataset")
+    parser.add_argument('--chunk-size', type=int, default=5000, help="Righe per blocco della lettura a colonne")
+    args = parser.parse_args()
+
+    errori = 0
+    sbagliate = check_dates()
+    if sbagliate:
+        errori += 1
+        print(f"parse_dates diverso da to_datetime per: {sbagliate}")
+    with tempfile.TemporaryDirectory() as directory:
+        sample = os.path.join(directory, '2020', f"csv_incidenti{MONTHS[1]}.csv")
+        write_sample(sample, sample_rows())
+        # Blocchi piccoli: gli incidenti dell'esempio vengono divisi tra più blocchi
+        for chunk_size in (1, 7, args.chunk_size):
+            errore = compare(sample, chunk_size, SAMPLE_ENCODING)
+            if errore:
+                errori += 1
+                print(f"CSV di esempio (blocchi da {chunk_size}): {errore}")
+        for caso in check_overflow(directory):
+            errori += 1
+            print(f"Id delle persone non univoci per {caso}, ma nessun errore di lettura")
+
+    for file_path in args.files or get_csv_files(args.dataset):
+        errore = compare(file_path, args.chunk_size)
+        if errore:
+            errori += 1
+        print(f"{file_path}: {errore or 'ok'}")
+
+    print("Normalizzazione a colonne identica a quella riga per riga." if not errori else f"{errori} differenze.")
+    raise SystemExit(1 if errori else 0)